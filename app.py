@@ -4,22 +4,49 @@
 今乐福 - Flask API.
 
 This entrypoint intentionally avoids local SQLite files, APScheduler, and
-long-running background processes.
+long-running background processes. The exceptions are the opt-in
+LOF_BACKGROUND_REFRESH daemon thread that keeps the realtime snapshot warm,
+the Jisilu cookie renewal thread (JISILU_BACKGROUND_LOGIN), and the opt-in
+HISTORY_STORE_DIR column files that make Tushare history fetches incremental.
 """
 
+import math
 import os
 import re
 import time
-from dataclasses import asdict
+from bisect import bisect_left, bisect_right
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from html import unescape
-from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
 
-from dotenv import load_dotenv
 import requests
-from flask import Flask, jsonify, request
-
-from lof_lib import JisiluAPI, filter_lof
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
+
+from lof_lib import (
+    HTTP_POOL,
+    LOF_FIELDS,
+    CircuitOpenError,
+    CookieRenewer,
+    EncodedBody,
+    HistoryCache,
+    HistoryStore,
+    JisiluAPI,
+    LOFSnapshot,
+    LOFSnapshotCache,
+    LOFTable,
+    diff_snapshots,
+    env_flag,
+    env_int,
+    filter_lof,
+)
+
+try:
+    import msgpack  # optional: enables application/msgpack responses for API consumers
+except ImportError:
+    msgpack = None
 
 load_dotenv()
 
@@ -30,7 +57,27 @@ TUSHARE_TIMEOUT = 12
 EASTMONEY_KLINE_URL = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
 EASTMONEY_NAV_URL = "https://fundf10.eastmoney.com/F10DataApi.aspx"
 EASTMONEY_TIMEOUT = 12
+# lsjz honours `per` up to about 49 rows; larger values fall back to the server's
+# own page size, which _eastmoney_nav_rows detects from the first page.
+EASTMONEY_NAV_PAGE_SIZE = max(1, env_int("EASTMONEY_NAV_PAGE_SIZE", 49))
+EASTMONEY_NAV_MAX_PAGES = 30
+EASTMONEY_NAV_WORKERS = max(1, env_int("EASTMONEY_NAV_WORKERS", 4))
+EASTMONEY_NAV_PAGE_RETRIES = 1
+# Overall budget for one history request: both legs plus any Eastmoney fallback.
+HISTORY_DEADLINE = max(1, env_int("HISTORY_DEADLINE", 25))
 TENCENT_KLINE_URL = "https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
+SSE_HEARTBEAT_SECONDS = 15
+SSE_RETRY_MS = 5000
+# Upper bound for ?limit=; far above the number of listed LOFs.
+MAX_QUERY_LIMIT = 10000
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack")
+# Fields the bundled page renders in the list view (it never shows estimate_value).
+PAGE_FIELDS = tuple(name for name in LOF_FIELDS if name != "estimate_value")
+
+
+# Logins run on a background thread ahead of cookie expiry, so scrapes never wait on
+# the login page. JISILU_BACKGROUND_LOGIN=0 restores inline login.
+_cookie_renewer = CookieRenewer() if env_flag("JISILU_BACKGROUND_LOGIN", True) else None
 
 
 def _api_client() -> JisiluAPI:
@@ -39,19 +86,135 @@ def _api_client() -> JisiluAPI:
         cookie=os.environ.get("JISILU_COOKIE"),
         username=os.environ.get("JISILU_USERNAME"),
         password=os.environ.get("JISILU_PASSWORD"),
+        cookie_renewer=_cookie_renewer,
     )
 
 
-def _success_response(data, api: JisiluAPI):
-    return jsonify(
-        {
+def _load_snapshot() -> LOFSnapshot:
+    snapshot = LOFSnapshot.fetch(_api_client())
+    # Encode the default views while the snapshot is built, off the request path.
+    _warm_bodies(snapshot)
+    return snapshot
+
+
+# History bars and NAVs only change after the close / NAV publication, so entries
+# live until the next refresh boundary instead of a fixed TTL.
+_history_cache = HistoryCache()
+# Optional on-disk column store (HISTORY_STORE_DIR): Tushare is only asked for the
+# days after the last stored date.
+_history_store = HistoryStore()
+
+# Shared by /api/lof and /api/lof/all so concurrent tabs reuse one upstream scrape.
+# LOF_BACKGROUND_REFRESH=1 turns this into stale-while-revalidate.
+_snapshot_cache = LOFSnapshotCache(_load_snapshot)
+
+
+class WireFormat(NamedTuple):
+    """How a realtime list goes on the wire; part of the body cache key and the ETag."""
+
+    columnar: bool = False
+    fields: Optional[Tuple[str, ...]] = None
+    msgpack: bool = False
+
+    @property
+    def key(self) -> str:
+        return "format={}&fields={}&media={}".format(
+            "columnar" if self.columnar else "rows",
+            ",".join(self.fields or ()),
+            "msgpack" if self.msgpack else "json",
+        )
+
+
+def _wire_format(args: Mapping[str, str], allow_msgpack: bool = True) -> WireFormat:
+    """Parse format=/fields= and negotiate MessagePack from the Accept header."""
+    layout = (args.get("format", "") or "rows").strip().lower()
+    if layout not in ("rows", "columnar"):
+        raise ValueError("format 只支持 rows 或 columnar")
+    fields = None
+    raw_fields = args.get("fields", "").strip()
+    if raw_fields:
+        fields = tuple(dict.fromkeys(name.strip() for name in raw_fields.split(",") if name.strip()))
+        unknown = [name for name in fields if name not in LOF_FIELDS]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}")
+    use_msgpack = (
+        allow_msgpack
+        and msgpack is not None
+        and request.accept_mimetypes.best_match(["application/json", *MSGPACK_MIMETYPES]) in MSGPACK_MIMETYPES
+    )
+    return WireFormat(columnar=layout == "columnar", fields=fields or None, msgpack=use_msgpack)
+
+
+def _json_with_rows(payload: Dict[str, Any], wire: WireFormat, **tables: LOFTable) -> str:
+    """Serialize payload and splice in tables as pre-encoded JSON."""
+    body = app.json.dumps(payload)
+    extra = "".join(
+        f',"{key}":{table.to_columnar_json(wire.fields) if wire.columnar else table.to_json(wire.fields)}'
+        for key, table in tables.items()
+    )
+    return body[:-1] + extra + "}"
+
+
+def _render(payload: Dict[str, Any], wire: WireFormat, **tables: LOFTable) -> EncodedBody:
+    if wire.columnar:
+        payload = {**payload, "format": "columnar"}
+    if wire.msgpack:
+        body = dict(payload)
+        for key, table in tables.items():
+            body[key] = table.to_records(wire.fields, columnar=wire.columnar)
+        return EncodedBody.from_bytes(msgpack.packb(body), MSGPACK_MIMETYPES[0])
+    return EncodedBody.from_text(_json_with_rows(payload, wire, **tables))
+
+
+def _encoded_response(body: EncodedBody):
+    """Serve pre-encoded bytes, picking br/gzip/identity from Accept-Encoding."""
+    data, encoding = body.negotiate(request.accept_encodings.quality)
+    response = app.response_class(data, mimetype=body.mimetype)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.update(("Accept", "Accept-Encoding"))
+    return response
+
+
+def _view_body(
+    snapshot: LOFSnapshot,
+    variant: str,
+    wire: WireFormat,
+    select: Callable[[], LOFTable],
+) -> EncodedBody:
+    """Encoded body of one snapshot view in one wire format, built once per snapshot."""
+
+    def build() -> EncodedBody:
+        data = select()
+        payload = {
             "success": True,
-            "data": [asdict(lof) for lof in data],
             "total": len(data),
-            "update_time": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "auth_status": api.get_auth_status(),
+            "update_time": snapshot.update_time,
+            "auth_status": snapshot.auth_status,
         }
-    )
+        return _render(payload, wire, data=data)
+
+    return snapshot.cached(("view", variant, wire), build)
+
+
+def _snapshot_response(
+    snapshot: LOFSnapshot,
+    variant: str,
+    wire: WireFormat,
+    select: Callable[[], LOFTable],
+):
+    """Serve a snapshot view, answering 304 when the client already has this version."""
+    etag = snapshot.etag(f"{variant}&{wire.key}")
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        # RFC 9110 §15.4.5: a 304 carries the same Vary as the 200 it stands in for
+        response.vary.update(("Accept", "Accept-Encoding"))
+    else:
+        response = _encoded_response(_view_body(snapshot, variant, wire, select))
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Age"] = str(int(snapshot.age))
+    return response
 
 
 def _today_yyyymmdd() -> str:
@@ -113,7 +276,7 @@ def _tushare_call(
     fields: str,
     token: str,
 ) -> List[Dict[str, Any]]:
-    response = requests.post(
+    response = HTTP_POOL.post(
         TUSHARE_API_URL,
         json={
             "api_name": api_name,
@@ -136,6 +299,37 @@ def _tushare_call(
     return [dict(zip(field_names, item)) for item in items]
 
 
+def _tushare_price_rows(ts_code: str, start_date: str, end_date: str, token: str) -> List[Dict[str, Any]]:
+    return _normalize_price_rows(
+        _tushare_call(
+            "fund_daily",
+            {
+                "ts_code": ts_code,
+                "start_date": start_date,
+                "end_date": end_date,
+            },
+            "ts_code,trade_date,open,high,low,close,pre_close,change,pct_chg,vol,amount",
+            token,
+        )
+    )
+
+
+def _tushare_nav_rows(ts_code: str, start_date: str, end_date: str, token: str) -> List[Dict[str, Any]]:
+    return _normalize_nav_rows(
+        _tushare_call(
+            "fund_nav",
+            {
+                "ts_code": ts_code,
+                "start_date": start_date,
+                "end_date": end_date,
+                "market": "E",
+            },
+            "ts_code,ann_date,nav_date,unit_nav,accum_nav,accum_div,net_asset,total_netasset,adj_nav",
+            token,
+        )
+    )
+
+
 def _to_float(value: Any) -> Optional[float]:
     if value in (None, "", "-", "--"):
         return None
@@ -199,7 +393,7 @@ def _normalize_nav_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 
 def _eastmoney_price_rows(fund_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
     clean_id = _clean_fund_id(fund_id)
-    response = requests.get(
+    response = HTTP_POOL.get(
         EASTMONEY_KLINE_URL,
         params={
             "secid": f"{_eastmoney_market_prefix(clean_id)}.{clean_id}",
@@ -243,7 +437,7 @@ def _eastmoney_price_rows(fund_id: str, start_date: str, end_date: str) -> List[
 
 def _tencent_price_rows(fund_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
     symbol = _tencent_symbol(fund_id)
-    response = requests.get(
+    response = HTTP_POOL.get(
         TENCENT_KLINE_URL,
         params={"param": f"{symbol},day,,,420,qfq"},
         headers={"User-Agent": "Mozilla/5.0", "Referer": "https://gu.qq.com/"},
@@ -317,83 +511,90 @@ def _extract_table_rows(html_text: str) -> List[List[str]]:
     return rows
 
 
-def _eastmoney_nav_rows(fund_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
-    clean_id = _clean_fund_id(fund_id)
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Referer": f"https://fundf10.eastmoney.com/jjjz_{clean_id}.html",
-    }
-    rows = []
-    seen_dates = set()
-    pages = 1
-
-    for page in range(1, 31):
-        response = requests.get(
-            EASTMONEY_NAV_URL,
-            params={
-                "type": "lsjz",
-                "code": clean_id,
-                "page": str(page),
-                "per": "20",
-                "sdate": _yyyymmdd_to_iso(start_date),
-                "edate": _yyyymmdd_to_iso(end_date),
-            },
-            headers=headers,
-            timeout=EASTMONEY_TIMEOUT,
-        )
-        response.raise_for_status()
-
-        page_match = re.search(r"pages:(\d+)", response.text)
-        if page_match:
-            pages = max(1, int(page_match.group(1)))
-
-        for cells in _extract_table_rows(response.text):
-            if len(cells) < 3 or not re.match(r"^\d{4}-\d{2}-\d{2}$", cells[0]):
-                continue
-            nav_date = cells[0].replace("-", "")
-            if nav_date in seen_dates:
-                continue
-            seen_dates.add(nav_date)
-            rows.append(
-                {
-                    "nav_date": nav_date,
-                    "ann_date": None,
-                    "unit_nav": cells[1],
-                    "accum_nav": cells[2],
-                    "adj_nav": None,
-                }
+def _eastmoney_nav_page(
+    clean_id: str,
+    start_date: str,
+    end_date: str,
+    page: int,
+    per: int,
+) -> Tuple[List[Dict[str, Any]], int, int]:
+    """Fetch one lsjz page, retrying transient failures; returns (rows, pages, records)."""
+    for attempt in range(EASTMONEY_NAV_PAGE_RETRIES + 1):
+        try:
+            response = HTTP_POOL.get(
+                EASTMONEY_NAV_URL,
+                params={
+                    "type": "lsjz",
+                    "code": clean_id,
+                    "page": str(page),
+                    "per": str(per),
+                    "sdate": _yyyymmdd_to_iso(start_date),
+                    "edate": _yyyymmdd_to_iso(end_date),
+                },
+                headers={
+                    "User-Agent": "Mozilla/5.0",
+                    "Referer": f"https://fundf10.eastmoney.com/jjjz_{clean_id}.html",
+                },
+                timeout=EASTMONEY_TIMEOUT,
             )
-
-        if page >= pages:
+            response.raise_for_status()
             break
-
-    return _normalize_nav_rows(rows)
+        except CircuitOpenError:
+            raise
+        except requests.RequestException:
+            if attempt >= EASTMONEY_NAV_PAGE_RETRIES:
+                raise
+
+    pages_match = re.search(r"pages:(\d+)", response.text)
+    records_match = re.search(r"records:(\d+)", response.text)
+    rows = []
+    for cells in _extract_table_rows(response.text):
+        if len(cells) < 3 or not re.match(r"^\d{4}-\d{2}-\d{2}$", cells[0]):
+            continue
+        rows.append(
+            {
+                "nav_date": cells[0].replace("-", ""),
+                "ann_date": None,
+                "unit_nav": cells[1],
+                "accum_nav": cells[2],
+                "adj_nav": None,
+            }
+        )
+    pages = max(1, int(pages_match.group(1))) if pages_match else 1
+    records = int(records_match.group(1)) if records_match else 0
+    return rows, pages, records
 
 
-def _eastmoney_history_response(
-    fund_id: str,
-    range_key: str,
-    start_date: str,
-    end_date: str,
-) -> Dict[str, Any]:
-    price_rows = _public_price_rows(fund_id, start_date, end_date)
-    nav_rows = _eastmoney_nav_rows(fund_id, start_date, end_date)
-    if not price_rows and not nav_rows:
-        raise RuntimeError("东方财富未返回可用历史价格或净值数据")
+def _eastmoney_nav_rows(fund_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    clean_id = _clean_fund_id(fund_id)
+    per = EASTMONEY_NAV_PAGE_SIZE
+    first_rows, pages, records = _eastmoney_nav_page(clean_id, start_date, end_date, 1, per)
+    if pages > 1 and 0 < len(first_rows) < per:
+        # The endpoint silently caps `per`; keep paging at the size it actually honoured.
+        per = len(first_rows)
+        if records:
+            pages = -(-records // per)
+    pages = min(pages, EASTMONEY_NAV_MAX_PAGES)
+
+    by_page = {1: first_rows}
+    if pages > 1:
+        workers = min(EASTMONEY_NAV_WORKERS, pages - 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eastmoney-nav") as pool:
+            futures = {
+                pool.submit(_eastmoney_nav_page, clean_id, start_date, end_date, page, per): page
+                for page in range(2, pages + 1)
+            }
+            for future, page in futures.items():
+                by_page[page] = future.result()[0]
 
-    return {
-        "success": True,
-        "fund_id": _clean_fund_id(fund_id),
-        "ts_code": None,
-        "range": range_key,
-        "start_date": _iso_to_yyyymmdd(start_date),
-        "end_date": _iso_to_yyyymmdd(end_date),
-        "price": price_rows,
-        "nav": nav_rows,
-        "comparison": _merge_history(price_rows, nav_rows),
-        "source": "eastmoney",
-        "update_time": time.strftime("%Y-%m-%d %H:%M:%S"),
-    }
+    rows = []
+    seen_dates = set()
+    for page in sorted(by_page):
+        for row in by_page[page]:
+            if row["nav_date"] not in seen_dates:
+                seen_dates.add(row["nav_date"])
+                rows.append(row)
+    return _normalize_nav_rows(rows)
 
 
 def _merge_history(
@@ -442,27 +643,95 @@ def health():
             "has_jisilu_dynamic_login": bool(
                 os.environ.get("JISILU_USERNAME") and os.environ.get("JISILU_PASSWORD")
             ),
+            "upstreams": HTTP_POOL.upstream_stats(),
+            "history_cache": _history_cache.stats(),
+            "history_store": _history_store.stats(),
         }
     )
 
 
-@app.get("/api/lof")
-def get_lof_data():
-    """Return real-time LOF data. The browser applies display filters."""
-    api = _api_client()
+def _lof_query_args(
+    args: Mapping[str, str],
+    only_limited: bool = False,
+    min_premium: Optional[float] = -100,
+) -> Dict[str, Any]:
+    """Parse the server-side filter parameters shared by the realtime routes."""
+
+    def number(name: str, default: Optional[float]) -> Optional[float]:
+        value = args.get(name, "").strip()
+        if not value:
+            return default
+        try:
+            parsed = float(value)
+        except ValueError:
+            raise ValueError(f"{name} 必须是数字") from None
+        if not math.isfinite(parsed):
+            raise ValueError(f"{name} 必须是有限数字")
+        return parsed
+
+    limit = number("limit", 0) or 0
+    if limit < 0 or limit != int(limit):
+        raise ValueError("limit 必须是非负整数")
+    if limit > MAX_QUERY_LIMIT:
+        raise ValueError(f"limit 不能超过 {MAX_QUERY_LIMIT}")
+    flag = args.get("only_limited", "").strip().lower()
+    return {
+        "min_premium": number("min_premium", min_premium),
+        "min_volume": number("min_volume", 0.0),
+        "only_limited": flag in ("1", "true", "yes", "on") if flag else only_limited,
+        "fund_type": args.get("fund_type", "").strip() or None,
+        "q": args.get("q", "").strip(),
+        "limit": int(limit),
+    }
+
+
+def _query_variant(route: str, query: Dict[str, Any]) -> str:
+    """ETag variant: the same snapshot filtered differently must not share a 304."""
+    return route + "?" + urlencode(sorted((key, str(value)) for key, value in query.items()))
+
+
+# Realtime routes and their default filters; the defaults are pre-encoded per snapshot.
+REALTIME_ROUTES: Dict[str, Dict[str, Any]] = {
+    "lof": {},
+    "lof/all": {"only_limited": True, "min_premium": None},
+}
+
+
+# What the bundled page requests; pre-encoded alongside the default JSON views.
+PAGE_WIRE_FORMAT = WireFormat(columnar=True, fields=PAGE_FIELDS)
+
+
+def _warm_bodies(snapshot: LOFSnapshot) -> None:
+    for route, defaults in REALTIME_ROUTES.items():
+        query = _lof_query_args({}, **defaults)
+        for wire in (WireFormat(), PAGE_WIRE_FORMAT):
+            _view_body(snapshot, _query_variant(route, query), wire, lambda: snapshot.data.query(**query))
+
+
+def _query_response(route: str):
+    try:
+        query = _lof_query_args(request.args, **REALTIME_ROUTES[route])
+        wire = _wire_format(request.args)
+    except ValueError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 400
     try:
-        all_lof = api.get_all_lof()
-        filtered = filter_lof(
-            all_lof,
-            min_premium=-100,
-            min_volume=0,
-            only_limited=False,
+        snapshot = _snapshot_cache.get()
+        return _snapshot_response(
+            snapshot,
+            _query_variant(route, query),
+            wire,
+            lambda: snapshot.data.query(**query),
         )
-        return _success_response(filtered, api)
     except Exception as exc:
         return jsonify({"success": False, "error": str(exc)}), 500
 
 
+@app.get("/api/lof")
+def get_lof_data():
+    """Return real-time LOF data, optionally filtered, searched and truncated server-side."""
+    return _query_response("lof")
+
+
 @app.get("/api/lof/<fund_id>/history")
 def get_lof_history(fund_id: str):
     """Return on-demand LOF exchange price and NAV history."""
@@ -471,73 +740,321 @@ def get_lof_history(fund_id: str):
     end_date = request.args.get("end_date") or _today_yyyymmdd()
     token = os.environ.get("TUSHARE_TOKEN") or os.environ.get("TUSHARE_PRO_TOKEN")
 
+    start, end = _iso_to_yyyymmdd(start_date), _iso_to_yyyymmdd(end_date)
     try:
-        if not token:
-            return jsonify(_eastmoney_history_response(fund_id, range_key, start_date, end_date))
-
-        ts_code = _fund_ts_code(fund_id)
-        price_rows = _normalize_price_rows(
-            _tushare_call(
-                "fund_daily",
-                {
-                    "ts_code": ts_code,
-                    "start_date": start_date,
-                    "end_date": end_date,
-                },
-                "ts_code,trade_date,open,high,low,close,pre_close,change,pct_chg,vol,amount",
-                token,
-            )
-        )
-        nav_rows = _normalize_nav_rows(
-            _tushare_call(
-                "fund_nav",
-                {
-                    "ts_code": ts_code,
-                    "start_date": start_date,
-                    "end_date": end_date,
-                    "market": "E",
-                },
-                "ts_code,ann_date,nav_date,unit_nav,accum_nav,accum_div,net_asset,total_netasset,adj_nav",
-                token,
+        if _in_history_window(start, end):
+            window, fetched_at, hit = _history_window(fund_id, token, start, end)
+            payload = window.slice(start, end)
+        else:
+            key = (fund_id, start_date, end_date, "tushare" if token else "eastmoney")
+            payload, fetched_at, hit = _history_cache.get_or_load(
+                key, lambda: _history_payload(fund_id, range_key, start_date, end_date, token)
             )
+    except Exception as exc:
+        return jsonify({"success": False, "error": str(exc)}), 502
+
+    response = jsonify(dict(payload, range=range_key))
+    response.headers["X-History-Cache"] = "hit" if hit else "miss"
+    response.headers["Age"] = str(int(time.time() - fetched_at))
+    return response
+
+
+class HistoryWindow(NamedTuple):
+    """The widest (1y) history for one fund; every range inside it is sliced out locally."""
+
+    payload: Dict[str, Any]
+    price_dates: List[str]
+    nav_dates: List[str]
+
+    @classmethod
+    def build(cls, payload: Dict[str, Any]) -> "HistoryWindow":
+        return cls(
+            payload,
+            [row["raw_date"] for row in payload["price"]],
+            [row["raw_date"] for row in payload["nav"]],
         )
 
-        return jsonify(
-            {
-                "success": True,
-                "fund_id": fund_id,
-                "ts_code": ts_code,
-                "range": range_key,
-                "start_date": start_date,
-                "end_date": end_date,
-                "price": price_rows,
-                "nav": nav_rows,
-                "comparison": _merge_history(price_rows, nav_rows),
-                "source": "tushare",
-                "update_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    def covers(self, start: str, end: str) -> bool:
+        return self.payload["start_date"] <= start and end <= self.payload["end_date"]
+
+    def slice(self, start: str, end: str) -> Dict[str, Any]:
+        lo = bisect_left(self.price_dates, start)
+        hi = bisect_right(self.price_dates, end)
+        nav_lo = bisect_left(self.nav_dates, start)
+        nav_hi = bisect_right(self.nav_dates, end)
+        price = self.payload["price"][lo:hi]
+        nav = self.payload["nav"][nav_lo:nav_hi]
+        # Only the leading days priced off a NAV published before `start` differ from a
+        # fetch of exactly [start, end]; re-merge those against the sliced NAVs.
+        boundary = bisect_left(self.price_dates, nav[0]["raw_date"], lo, hi) if nav else hi
+        comparison = _merge_history(price[: boundary - lo], []) + self.payload["comparison"][boundary:hi]
+        return dict(self.payload, start_date=start, end_date=end, price=price, nav=nav, comparison=comparison)
+
+
+def _in_history_window(start: str, end: str) -> bool:
+    return (
+        all(len(value) == 8 and value.isdigit() for value in (start, end))
+        and _history_start_date("1y") <= start <= end <= _today_yyyymmdd()
+    )
+
+
+def _history_window(fund_id: str, token: Optional[str], start: str, end: str) -> Tuple[HistoryWindow, float, bool]:
+    """Return (window, fetched_at, hit); the 1y window is fetched once per fund and source."""
+    key = (fund_id, "window", "tushare" if token else "eastmoney")
+    cached = _history_cache.get(key)
+    if cached is not None and cached[0].covers(start, end):
+        return cached[0], cached[1], True
+    window = HistoryWindow.build(
+        _history_payload(fund_id, "1y", _history_start_date("1y"), _today_yyyymmdd(), token)
+    )
+    _history_cache.put(key, window)
+    return window, time.time(), False
+
+
+def _history_payload(
+    fund_id: str,
+    range_key: str,
+    start_date: str,
+    end_date: str,
+    token: Optional[str],
+) -> Dict[str, Any]:
+    """Fetch price and NAV history concurrently; raises when a leg fails on every source."""
+    rows, sources, ts_code = _history_legs(fund_id, start_date, end_date, token)
+    price_rows, nav_rows = rows["price"], rows["nav"]
+    if not price_rows and not nav_rows and "tushare" not in sources.values():
+        raise RuntimeError("东方财富未返回可用历史价格或净值数据")
+
+    source = sources["price"] if sources["price"] == sources["nav"] else "mixed"
+    return {
+        "success": True,
+        "fund_id": _clean_fund_id(fund_id),
+        "ts_code": ts_code if "tushare" in sources.values() else None,
+        "range": range_key,
+        "start_date": _iso_to_yyyymmdd(start_date),
+        "end_date": _iso_to_yyyymmdd(end_date),
+        "price": price_rows,
+        "nav": nav_rows,
+        "comparison": _merge_history(price_rows, nav_rows),
+        "source": source,
+        "sources": sources,
+        "update_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def _history_legs(
+    fund_id: str,
+    start_date: str,
+    end_date: str,
+    token: Optional[str],
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str], Optional[str]]:
+    """
+    Run the price and NAV legs side by side under HISTORY_DEADLINE.
+
+    Each leg tries Tushare first (when configured) and falls back to Eastmoney on its
+    own, so a leg that already succeeded is never fetched again. Every request gets
+    its own two workers, so legs start at once instead of queueing behind other
+    requests. Returns (rows by leg, source by leg, ts_code).
+    """
+    deadline = time.monotonic() + HISTORY_DEADLINE
+    fallbacks: Dict[str, Callable[[], List[Dict[str, Any]]]] = {
+        "price": lambda: _public_price_rows(fund_id, start_date, end_date),
+        "nav": lambda: _eastmoney_nav_rows(fund_id, start_date, end_date),
+    }
+    primary: Dict[str, Callable[[], List[Dict[str, Any]]]] = {}
+    errors: Dict[str, Exception] = {}
+    ts_code = None
+    if token:
+        try:
+            ts_code = _fund_ts_code(fund_id)
+        except ValueError as exc:
+            errors = {"price": exc, "nav": exc}
+        else:
+            primary = {
+                "price": lambda: _history_store.sync(
+                    f"tushare/{ts_code}",
+                    "price",
+                    start_date,
+                    end_date,
+                    lambda start, end: _tushare_price_rows(ts_code, start, end, token),
+                ),
+                "nav": lambda: _history_store.sync(
+                    f"tushare/{ts_code}",
+                    "nav",
+                    start_date,
+                    end_date,
+                    lambda start, end: _tushare_nav_rows(ts_code, start, end, token),
+                ),
             }
-        )
-    except Exception as exc:
-        if token:
-            try:
-                return jsonify(_eastmoney_history_response(fund_id, range_key, start_date, end_date))
-            except Exception:
-                pass
-        return jsonify({"success": False, "error": str(exc)}), 502
+
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history")
+    pending = {}
+    rows: Dict[str, List[Dict[str, Any]]] = {}
+    sources: Dict[str, str] = {}
+    try:
+        for leg in ("price", "nav"):
+            if leg in primary:
+                pending[pool.submit(primary[leg])] = (leg, "tushare")
+            else:
+                pending[pool.submit(fallbacks[leg])] = (leg, "eastmoney")
+
+        while pending:
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                leg, source = pending.pop(future)
+                try:
+                    rows[leg] = future.result()
+                    sources[leg] = source
+                except Exception as exc:
+                    errors.setdefault(leg, exc)
+                    if source == "tushare":
+                        print(f"[history] tushare {leg} fallback to eastmoney: {exc}")
+                        pending[pool.submit(fallbacks[leg])] = (leg, "eastmoney")
+    finally:
+        # A late leg finishes on this request's own thread; nothing else queues behind it.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    for leg, _ in pending.values():
+        label = "价格" if leg == "price" else "净值"
+        errors.setdefault(leg, TimeoutError(f"历史{label}数据超过 {HISTORY_DEADLINE} 秒未返回"))
+    for leg in ("price", "nav"):
+        if leg not in rows:
+            raise errors[leg]
+    return rows, {leg: sources[leg] for leg in ("price", "nav")}, ts_code
 
 
 @app.get("/api/lof/all")
 def get_all_lof_data():
     """Return all currently limited or paused LOF data sorted by premium."""
-    api = _api_client()
+    return _query_response("lof/all")
+
+
+def _changes_view(snapshot: LOFSnapshot, since: str) -> Tuple[Dict[str, Any], Dict[str, LOFTable]]:
+    """Diff against `since`, computed once per snapshot and shared by every format."""
+    return snapshot.cached(("changes", since), lambda: _changes_payload(snapshot, since))
+
+
+def _changes_text(snapshot: LOFSnapshot, since: str, wire: WireFormat) -> Tuple[bool, str]:
+    """Cached per snapshot, so every SSE client at the same version shares one encoding."""
+
+    def build() -> Tuple[bool, str]:
+        payload, tables = _changes_view(snapshot, since)
+        if wire.columnar:
+            payload = {**payload, "format": "columnar"}
+        return payload["full"], _json_with_rows(payload, wire, **tables)
+
+    return snapshot.cached(("changes-text", since, wire), build)
+
+
+def _changes_body(snapshot: LOFSnapshot, since: str, wire: WireFormat) -> EncodedBody:
+    def build() -> EncodedBody:
+        if wire.msgpack:
+            payload, tables = _changes_view(snapshot, since)
+            return _render(payload, wire, **tables)
+        return EncodedBody.from_text(_changes_text(snapshot, since, wire)[1])
+
+    return snapshot.cached(("changes-body", since, wire), build)
+
+
+def _changes_payload(snapshot: LOFSnapshot, since: str) -> Tuple[Dict[str, Any], Dict[str, LOFTable]]:
+    """Return the changes payload and the tables to splice into it."""
+    base = _snapshot_cache.find_version(since) if since else None
+    payload: Dict[str, Any] = {
+        "success": True,
+        "version": snapshot.version,
+        "since": since or None,
+        "full": base is None,
+        "update_time": snapshot.update_time,
+        "auth_status": snapshot.auth_status,
+    }
+    if base is None:
+        data = filter_lof(snapshot.data, min_premium=-100)
+        payload["total"] = len(data)
+        return payload, {"data": data}
+    changed, removed = diff_snapshots(base, snapshot)
+    changed = filter_lof(changed, min_premium=-100)
+    payload.update({"removed": removed, "total": len(snapshot.data)})
+    return payload, {"changed": changed}
+
+
+@app.get("/api/lof/changes")
+def get_lof_changes():
+    """Return rows changed since a snapshot version, or a full snapshot if it is too old."""
+    since = request.args.get("since", "").strip()
     try:
-        all_lof = api.get_all_lof()
-        filtered = filter_lof(all_lof, only_limited=True)
-        return _success_response(filtered, api)
+        wire = _wire_format(request.args)
+    except ValueError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 400
+    try:
+        snapshot = _snapshot_cache.get()
+        response = _encoded_response(_changes_body(snapshot, since, wire))
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Age"] = str(int(snapshot.age))
+        return response
     except Exception as exc:
         return jsonify({"success": False, "error": str(exc)}), 500
 
 
+def _sse_event(event: str, data: str, event_id: Optional[str] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.insert(0, f"id: {event_id}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _lof_event_stream(last_event_id: str, wire: WireFormat):
+    """Push a full snapshot or a diff every time the shared snapshot changes."""
+    known_version = last_event_id
+    known_revision = ""
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    while True:
+        try:
+            # Without the background refresher this also triggers the single-flight
+            # refresh once the TTL expires, so N clients still cost one upstream scrape.
+            snapshot = _snapshot_cache.get()
+        except Exception as exc:
+            yield _sse_event("error", app.json.dumps({"success": False, "error": str(exc)}))
+            time.sleep(SSE_HEARTBEAT_SECONDS)
+            continue
+
+        if snapshot.revision != known_revision:
+            full, body = _changes_text(snapshot, known_version, wire)
+            yield _sse_event(
+                "snapshot" if full else "changes",
+                body,
+                event_id=snapshot.version,
+            )
+            known_version = snapshot.version
+            known_revision = snapshot.revision
+
+        timeout = SSE_HEARTBEAT_SECONDS
+        if not _snapshot_cache.background_refresh:
+            timeout = min(timeout, max(1.0, _snapshot_cache.ttl - snapshot.age))
+        updated = _snapshot_cache.wait_for_update(known_revision, timeout)
+        if updated is None or updated.revision == known_revision:
+            yield ": heartbeat\n\n"
+
+
+@app.get("/api/lof/stream")
+def stream_lof():
+    """Server-Sent Events stream of snapshot diffs; supports Last-Event-ID resume."""
+    last_event_id = (
+        request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or ""
+    ).strip()
+    try:
+        # EventSource is text-only, so the stream never switches to MessagePack.
+        wire = _wire_format(request.args, allow_msgpack=False)
+    except ValueError as exc:
+        return jsonify({"success": False, "error": str(exc)}), 400
+    return Response(
+        _lof_event_stream(last_event_id, wire),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "5003"))
     app.run(host="127.0.0.1", port=port, debug=True)
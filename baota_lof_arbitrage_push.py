@@ -41,6 +41,13 @@ JISILU_BASE_URL = "https://www.jisilu.cn"
 PROJECT_URL = "http://8.134.134.156/happy-lof/"
 LEGACY_ENV_FILE = Path("/www/wwwroot/happy-lof/.env")
 
+# 与 lof_lib.py 放在同一目录时共用项目的连接池；单独部署时退回普通 Session，
+# 没有共享连接池、熔断和录制回放
+try:
+    from lof_lib import HTTP_POOL
+except ImportError:
+    HTTP_POOL = None
+
 ENDPOINTS = (
     ("指数LOF", "/data/lof/index_lof_list/", "https://www.jisilu.cn/data/lof/", {}, True),
     ("股票LOF", "/data/lof/stock_lof_list/", "https://www.jisilu.cn/data/lof/", {}, True),
@@ -167,7 +174,8 @@ class LofArbitragePush:
         self.max_items = int(lof_config.get("max_items", 10))
         self.auth_warning = ""
 
-        self.session = requests.Session()
+        # 共用项目的连接池：熔断、对冲以及 LOF_FIXTURE_RECORD/LOF_UPSTREAM_REPLAY 录制回放
+        self.session = HTTP_POOL.session() if HTTP_POOL is not None else requests.Session()
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
                           "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -257,6 +265,8 @@ class LofArbitragePush:
         return all_data
 
     def filter_targets(self, all_data):
+        """返回 (溢价率最高的前 max_items 只, 符合条件的总数)"""
+        # 与首页“有利可套”一致：限购 + 溢价 + 成交额，限购基金也必须满足成交额门槛
         targets = []
         for fund in all_data:
             if "限" not in fund["apply_status"]:
@@ -267,14 +277,14 @@ class LofArbitragePush:
                 continue
             targets.append(fund)
 
-        return sorted(targets, key=lambda item: item["premium_rate"], reverse=True)
+        targets.sort(key=lambda item: item["premium_rate"], reverse=True)
+        return targets[:self.max_items], len(targets)
 
-    def build_message(self, targets):
+    def build_message(self, shown, total):
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-        shown = targets[:self.max_items]
         lines = [
             "发现 %d 只 LOF 套利候选，筛选口径：限购 + 溢价>=%.2f%% + 成交额>=%.0f万"
-            % (len(targets), self.min_premium, self.min_volume),
+            % (total, self.min_premium, self.min_volume),
             "时间：%s" % now,
             "",
         ]
@@ -299,9 +309,9 @@ class LofArbitragePush:
                 )
             )
 
-        if len(targets) > len(shown):
+        if total > len(shown):
             lines.append("")
-            lines.append("还有 %d 只未展示，请打开今乐福查看。" % (len(targets) - len(shown)))
+            lines.append("还有 %d 只未展示，请打开今乐福查看。" % (total - len(shown)))
 
         return "\n".join(lines)
 
@@ -342,8 +352,8 @@ class LofArbitragePush:
         all_data = self.get_all_lof()
         logging.info("获取 LOF 数据 %d 条", len(all_data))
 
-        targets = self.filter_targets(all_data)
-        if not targets:
+        targets, total = self.filter_targets(all_data)
+        if not total:
             if self.auth_warning:
                 content = "%s\n\n当前未发现符合条件的 LOF 套利机会。" % self.auth_warning
                 logging.warning("发送 LOF 数据源告警:\n%s", content)
@@ -352,7 +362,7 @@ class LofArbitragePush:
                 logging.info("暂无符合条件的 LOF 套利机会，不发送消息")
             return
 
-        content = self.build_message(targets)
+        content = self.build_message(targets, total)
         if self.auth_warning:
             content = "%s\n\n%s" % (self.auth_warning, content)
         logging.info("发现 LOF 套利候选:\n%s", content)
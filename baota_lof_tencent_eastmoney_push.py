@@ -29,7 +29,6 @@ from pathlib import Path
 
 import requests
 
-
 SCRIPT_DIR = Path(__file__).parent.absolute()
 LOG_FILE = SCRIPT_DIR / "lof_tencent_eastmoney_push.log"
 PROJECT_URL = "http://8.134.134.156/happy-lof/"
@@ -42,6 +41,13 @@ TENCENT_QUOTE_URL = "https://qt.gtimg.cn/q=%s"
 EASTMONEY_PURCHASE_URL = "https://fund.eastmoney.com/Data/Fund_JJJZ_Data.aspx"
 UNLIMITED_AMOUNT = 100000000000
 
+# 与 lof_lib.py 放在同一目录时共用项目的连接池；单独部署时退回普通 Session，
+# 没有共享连接池、熔断和录制回放
+try:
+    from lof_lib import HTTP_POOL
+except ImportError:
+    HTTP_POOL = None
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
@@ -111,7 +117,8 @@ class TencentEastmoneyLofPush:
         self.min_volume = float(lof_config.get("min_volume", 1000))
         self.max_items = int(lof_config.get("max_items", 10))
 
-        self.session = requests.Session()
+        # 共用项目的连接池：熔断、对冲以及 LOF_FIXTURE_RECORD/LOF_UPSTREAM_REPLAY 录制回放
+        self.session = HTTP_POOL.session() if HTTP_POOL is not None else requests.Session()
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
                           "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -289,11 +296,12 @@ class TencentEastmoneyLofPush:
             merged["limit_text"] = format_limit(daily_limit)
             targets.append(merged)
 
-        return sorted(targets, key=lambda item: item["premium_rate"], reverse=True)
+        # 返回 (溢价率最高的前 max_items 只, 符合条件的总数)
+        targets.sort(key=lambda item: item["premium_rate"], reverse=True)
+        return targets[:self.max_items], len(targets)
 
-    def build_message(self, targets):
+    def build_message(self, shown, total):
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-        shown = targets[:self.max_items]
         summary_parts = [
             "%s %.2f%% %s" % (
                 fund["fund_name"],
@@ -329,9 +337,9 @@ class TencentEastmoneyLofPush:
                 )
             )
 
-        if len(targets) > len(shown):
+        if total > len(shown):
             lines.append("")
-            lines.append("还有 %d 只未展示。" % (len(targets) - len(shown)))
+            lines.append("还有 %d 只未展示。" % (total - len(shown)))
 
         lines.append("")
         lines.append(
@@ -378,15 +386,15 @@ class TencentEastmoneyLofPush:
             return []
 
         logging.info("开始检查 LOF 套利机会（腾讯+东财）")
-        targets = self.get_targets()
-        if not targets:
+        targets, total = self.get_targets()
+        if not total:
             logging.info("暂无符合条件的 LOF 套利机会，不发送消息")
             return []
 
-        content = self.build_message(targets)
+        content = self.build_message(targets, total)
         logging.info("发现 LOF 套利候选:\n%s", content)
         if not dry_run:
-            self.send_msg(content, title="LOF套利提醒｜共 %d 只候选" % len(targets))
+            self.send_msg(content, title="LOF套利提醒｜共 %d 只候选" % total)
         else:
             logging.info("dry-run 模式，不发送 Bark")
         return targets
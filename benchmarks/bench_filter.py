@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LOF 筛选基准：对比旧版 filter_lof（三次列表推导 + 全量排序）与当前 filter_lof（列表单次遍历、LOFTable 按列筛选）。
+
+用法：
+    python3 benchmarks/bench_filter.py                 # 500 / 5k / 50k 行
+    python3 benchmarks/bench_filter.py --rows 2000 --top 10
+
+每个规模测三种口径：首页（溢价 >= -100）、只看限购（限购 + 溢价 + 成交额）、只看限购且只取前 N 条。
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lof_lib import LOFInfo, LOFTable, filter_lof  # noqa: E402
+
+
+def legacy_filter_lof(data, min_premium=None, min_volume=0.0, only_limited=False):
+    """重构前的 filter_lof"""
+    filtered = data
+    if min_premium is not None:
+        filtered = [lof for lof in filtered if lof.premium_rate >= min_premium]
+    if min_volume > 0:
+        filtered = [lof for lof in filtered if lof.volume >= min_volume or "暂停" in lof.apply_status or "限" in lof.apply_status]
+    if only_limited:
+        filtered = [lof for lof in filtered if lof.apply_status not in ("开放申购", "开放", "")]
+    return sorted(filtered, key=lambda x: x.premium_rate, reverse=True)
+
+
+def synthetic_funds(count, seed=11):
+    rng = random.Random(seed)
+    statuses = ("开放申购", "限大额", "暂停申购", "限100元", "开放")
+    return [
+        LOFInfo(
+            fund_id=f"{100000 + index}",
+            fund_name=f"测试LOF{index}",
+            price=rng.uniform(0.5, 3.0),
+            change_pct=rng.uniform(-5, 5),
+            net_value=rng.uniform(0.5, 3.0),
+            premium_rate=round(rng.uniform(-5, 10), 2),
+            volume=rng.uniform(0, 20000),
+            apply_status=rng.choice(statuses),
+            fund_type=rng.choice(("指数LOF", "股票LOF", "QDII")),
+        )
+        for index in range(count)
+    ]
+
+
+def per_call_ms(func, min_seconds):
+    loops = 0
+    started = time.perf_counter()
+    while True:
+        func()
+        loops += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / loops * 1000
+
+
+def report(label, before, after):
+    print(f"  {label:<26} before={before:>9.3f} ms  after={after:>9.3f} ms  speedup={before / after:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[500, 5000, 50000], help="数据规模")
+    parser.add_argument("--top", type=int, default=10, help="只取前 N 条")
+    parser.add_argument("--seconds", type=float, default=0.5, help="每项最短计时秒数")
+    args = parser.parse_args()
+
+    for count in args.rows:
+        funds = synthetic_funds(count)
+        table = LOFTable.from_rows(funds)
+        page = {"min_premium": -100}
+        limited = {"min_premium": 1.0, "min_volume": 1000, "only_limited": True}
+
+        # 结果一致性检查
+        for options in (page, limited):
+            expected = legacy_filter_lof(funds, **options)
+            assert filter_lof(funds, **options) == expected
+            assert filter_lof(table, **options).to_infos() == expected
+            assert filter_lof(funds, max_items=args.top, **options) == expected[:args.top]
+
+        print(f"rows={count}")
+        for label, options, top in (("page", page, None), ("limited", limited, None), (f"limited top {args.top}", limited, args.top)):
+            before = per_call_ms(lambda: legacy_filter_lof(funds, **options)[:top], args.seconds)
+            report(f"{label} (list)", before, per_call_ms(lambda: filter_lof(funds, max_items=top, **options), args.seconds))
+            report(f"{label} (LOFTable)", before, per_call_ms(lambda: filter_lof(table, max_items=top, **options), args.seconds))
+
+
+if __name__ == "__main__":
+    main()
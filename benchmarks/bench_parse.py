@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+集思录行解析基准：对比旧版逐字段解析与 lof_lib.parse_rows 的每秒行数。
+
+用法：
+    python3 benchmarks/bench_parse.py                      # 使用合成数据
+    python3 benchmarks/bench_parse.py --payload a.json ... # 使用录制的集思录响应
+
+录制文件是集思录列表接口的原始 JSON（包含 rows），文件名含 qdii 时按 QDII 规格解析。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lof_lib import LOF_ROW_SPEC, QDII_ROW_SPEC, LOFInfo, parse_rows  # noqa: E402
+
+
+# ---- 旧实现（基线），与重构前 JisiluAPI 的解析逻辑一致 ----
+
+def legacy_parse_percentage(value):
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        clean_value = str(value).replace("%", "").replace(" ", "").strip()
+        if clean_value in ("", "-", "--"):
+            return 0.0
+        return float(clean_value)
+    except Exception:
+        return 0.0
+
+
+def legacy_parse_float(value):
+    if value is None:
+        return 0.0
+    try:
+        clean_value = str(value).replace(",", "").strip()
+        if clean_value in ("", "-", "--"):
+            return 0.0
+        return float(clean_value)
+    except Exception:
+        return 0.0
+
+
+def legacy_has_value(raw):
+    if raw is None:
+        return False
+    s = str(raw).replace("%", "").replace(",", "").strip()
+    return s not in ("", "-", "--")
+
+
+def legacy_compute_premium(cell, price, api_premium_raw, prefer_estimate):
+    if legacy_has_value(api_premium_raw):
+        return legacy_parse_percentage(api_premium_raw), "接口"
+    estimate = legacy_parse_float(cell.get("estimate_value"))
+    fund_nav = legacy_parse_float(cell.get("fund_nav"))
+    candidates = (
+        [("估值", estimate), ("净值", fund_nav)]
+        if prefer_estimate
+        else [("净值", fund_nav), ("估值", estimate)]
+    )
+    if price > 0:
+        for label, ref in candidates:
+            if ref > 0:
+                return (price / ref - 1) * 100, label
+    return 0.0, "无"
+
+
+def legacy_parse_rows(rows, qdii, fund_type):
+    result = []
+    for row in rows:
+        cell = row.get("cell", {})
+        price = legacy_parse_float(cell.get("price"))
+        estimate_value = legacy_parse_float(cell.get("estimate_value"))
+        fund_nav = legacy_parse_float(cell.get("fund_nav"))
+        if qdii:
+            api_premium_raw = (
+                cell.get("discount_rt")
+                if legacy_has_value(cell.get("discount_rt"))
+                else cell.get("t1_premium_rate")
+            )
+        else:
+            api_premium_raw = cell.get("discount_rt")
+        premium_rate, premium_source = legacy_compute_premium(
+            cell, price, api_premium_raw, prefer_estimate=not qdii
+        )
+        result.append(LOFInfo(
+            fund_id=cell.get("fund_id", ""),
+            fund_name=cell.get("fund_nm", ""),
+            price=price,
+            change_pct=legacy_parse_percentage(cell.get("increase_rt")),
+            net_value=fund_nav or estimate_value,
+            premium_rate=premium_rate,
+            volume=legacy_parse_float(cell.get("volume")),
+            apply_status=cell.get("apply_status", ""),
+            fund_type=fund_type,
+            estimate_value=estimate_value,
+            nav_date=cell.get("fund_nav_dt", "") or cell.get("nav_dt", ""),
+            premium_source=premium_source,
+        ))
+    return result
+
+
+# ---- 数据准备 ----
+
+def synthetic_rows(count, qdii, seed=7):
+    """按集思录字段格式生成行：字符串数值、百分号、千分位、被屏蔽的 '-' 字段"""
+    rng = random.Random(seed)
+    statuses = ("开放申购", "限大额", "暂停申购", "限100元")
+    rows = []
+    for index in range(count):
+        price = round(rng.uniform(0.5, 3.0), 3)
+        nav = round(price * rng.uniform(0.95, 1.05), 4)
+        cell = {
+            "fund_id": f"{160000 + index}",
+            "fund_nm": f"测试LOF{index}",
+            "price": f"{price:.3f}",
+            "increase_rt": f"{rng.uniform(-5, 5):.2f}%",
+            "fund_nav": f"{nav:.4f}" if rng.random() > 0.05 else "-",
+            "estimate_value": f"{nav * 1.001:.4f}" if rng.random() > 0.5 else "-",
+            "discount_rt": f"{rng.uniform(-3, 8):.2f}%" if rng.random() > 0.6 else "-",
+            "volume": f"{rng.uniform(0, 50000):,.2f}",
+            "apply_status": rng.choice(statuses),
+            "fund_nav_dt": "2026-10-16",
+        }
+        if qdii:
+            cell["t1_premium_rate"] = f"{rng.uniform(-3, 8):.2f}" if rng.random() > 0.3 else "-"
+        rows.append({"id": cell["fund_id"], "cell": cell})
+    return rows
+
+
+def load_payloads(paths, synthetic):
+    datasets = []
+    for path in paths:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        rows = data.get("rows") or []
+        datasets.append((Path(path).name, rows, "qdii" in Path(path).name.lower()))
+    if not datasets:
+        datasets.append(("synthetic-lof", synthetic_rows(synthetic, qdii=False), False))
+        datasets.append(("synthetic-qdii", synthetic_rows(synthetic, qdii=True), True))
+    return datasets
+
+
+def rows_per_second(func, rows, min_seconds):
+    loops = 0
+    started = time.perf_counter()
+    while True:
+        func()
+        loops += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return loops * len(rows) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payload", nargs="*", default=[], help="录制的集思录 JSON 响应文件")
+    parser.add_argument("--rows", type=int, default=500, help="合成数据行数（未指定 --payload 时）")
+    parser.add_argument("--seconds", type=float, default=1.0, help="每个实现的最短计时秒数")
+    args = parser.parse_args()
+
+    for name, rows, qdii in load_payloads(args.payload, args.rows):
+        spec = QDII_ROW_SPEC if qdii else LOF_ROW_SPEC
+        fund_type = "QDII" if qdii else "指数LOF"
+        legacy = legacy_parse_rows(rows, qdii, fund_type)
+        current = parse_rows(rows, spec, fund_type)
+        if legacy != current:
+            mismatches = sum(1 for a, b in zip(legacy, current) if a != b)
+            print(f"[WARN] {name}: {mismatches} 行结果与旧实现不一致")
+
+        before = rows_per_second(lambda: legacy_parse_rows(rows, qdii, fund_type), rows, args.seconds)
+        after = rows_per_second(lambda: parse_rows(rows, spec, fund_type), rows, args.seconds)
+        print(
+            f"{name:<18} rows={len(rows):<6} before={before:>12,.0f} rows/s  "
+            f"after={after:>12,.0f} rows/s  speedup={after / before:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
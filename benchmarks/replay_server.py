@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上游替身服务器：按录制的 fixture 应答集思录、Tushare、东方财富、腾讯的请求，可注入延迟和错误。
+
+录制（真实请求，响应写入 fixture 目录）：
+    LOF_FIXTURE_RECORD=benchmarks/fixtures flask --app app run --port 5003
+    LOF_FIXTURE_RECORD=benchmarks/fixtures python3 baota_lof_tencent_eastmoney_push.py --dry-run
+
+回放（不访问外网）：
+    python3 benchmarks/replay_server.py --fixtures benchmarks/fixtures --port 8765 --latency-ms 80
+    LOF_UPSTREAM_REPLAY=http://127.0.0.1:8765 flask --app app run --port 5003
+
+故障注入：
+    --error-rate 0.2 --error-status 503   # 20% 的请求返回 503
+    --hang-rate 0.1 --hang-seconds 30     # 10% 的请求挂起 30 秒（触发客户端超时）
+    --only-host eastmoney.com             # 延迟和故障只作用于该域名
+"""
+
+import argparse
+import base64
+import json
+import random
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from lof_lib import fixture_json_body, fixture_keys  # noqa: E402
+
+
+class FixtureIndex:
+    """按精确键和宽松键索引 fixture；精确键优先"""
+
+    def __init__(self, directory):
+        self.exact = {}
+        self.loose = {}
+        for path in sorted(Path(directory).glob("*/*.json")):
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            entry["body"] = base64.b64decode(entry["body"])
+            exact, loose = fixture_keys(entry["method"], entry["url"], entry.get("json_body"))
+            self.exact[exact] = entry
+            self.loose.setdefault(loose, entry)
+
+    def __len__(self):
+        return len(self.exact)
+
+    def find(self, method, url, json_body):
+        exact, loose = fixture_keys(method, url, json_body)
+        return self.exact.get(exact) or self.loose.get(loose)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    index = None
+    options = None
+    stats = Counter()
+    stats_lock = threading.Lock()
+
+    def do_GET(self):
+        self._replay()
+
+    def do_POST(self):
+        self._replay()
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def _replay(self):
+        # 路径格式：/<原主机><原路径>?<原查询串>
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        url = f"https://{host}/{path}" + (f"?{parts.query}" if parts.query else "")
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        json_body = fixture_json_body(body, self.headers.get("Content-Type", ""))
+
+        options = self.options
+        if not options.only_host or host.endswith(options.only_host):
+            delay = options.latency_ms + random.uniform(0, options.jitter_ms)
+            time.sleep(delay / 1000)
+            if random.random() < options.hang_rate:
+                self._count("hang")
+                time.sleep(options.hang_seconds)
+                self.close_connection = True
+                return
+            if random.random() < options.error_rate:
+                self._count("error")
+                return self._send(options.error_status, b'{"error": "injected"}', "application/json")
+
+        entry = self.index.find(self.command, url, json_body)
+        if entry is None:
+            self._count("miss")
+            print(f"[replay] 未找到 fixture: {self.command} {url}", file=sys.stderr)
+            return self._send(404, b'{"error": "no fixture"}', "application/json")
+
+        self._count("hit")
+        cookies = [f"{name}=replay; Path=/" for name in entry.get("set_cookies") or []]
+        self._send(entry["status"], entry["body"], entry.get("content_type") or "", cookies)
+
+    def _send(self, status, body, content_type, cookies=()):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for cookie in cookies:
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=str(ROOT / "benchmarks" / "fixtures"), help="fixture 目录")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个请求的固定延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="在固定延迟上叠加的随机延迟上限")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误状态码的比例")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="挂起不应答的比例")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--only-host", default="", help="只对该域名（后缀匹配）注入延迟和故障")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求")
+    args = parser.parse_args()
+
+    ReplayHandler.index = FixtureIndex(args.fixtures)
+    ReplayHandler.options = args
+    server = ThreadingHTTPServer((args.host, args.port), ReplayHandler)
+    server.daemon_threads = True
+    print(f"replay: {len(ReplayHandler.index)} 个 fixture，监听 http://{args.host}:{args.port}", flush=True)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"replay: {dict(ReplayHandler.stats)}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,803 @@ LOF 基金套利核心逻辑库
 包含数据获取 API 和数据模型
 """
 
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import mmap
+import operator
 import os
 import re
 import requests
+import shutil
+import socket
+import sys
+import tempfile
 import threading
 import time
-from typing import Optional, List, Dict, Any
-from dataclasses import dataclass
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.cookiejar import DefaultCookiePolicy
+from json.encoder import encode_basestring
+from typing import Optional, List, Dict, Any, Callable, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+from dataclasses import dataclass, fields
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+try:
+    import brotli  # 可选依赖，未安装时只提供 gzip 压缩
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl  # 仅 Unix；其他平台的本地缓存文件不加锁
+except ImportError:
+    fcntl = None
+
+
+def env_int(name: str, default: int) -> int:
+    """读取整数环境变量，缺省或格式错误时返回默认值"""
+    try:
+        return int(str(os.environ.get(name, "")).strip())
+    except (TypeError, ValueError):
+        return default
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """读取布尔环境变量：1/true/yes/on 视为开启"""
+    value = os.environ.get(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# 主要上游主机，各自使用独立的连接池；其余主机走通用 http/https 连接池
+UPSTREAM_PREFIXES = (
+    "https://www.jisilu.cn",
+    "http://api.tushare.pro",
+    "https://push2his.eastmoney.com",
+    "https://fundf10.eastmoney.com",
+    "https://web.ifzq.gtimg.cn",
+)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """上游熔断期间直接失败，不发出请求；继承 ConnectionError，调用方按网络错误处理即可"""
+
+
+class UpstreamHealth:
+    """
+    单个上游主机的熔断器和延迟统计。
+
+    连续 failure_threshold 次失败（网络异常、超时、429/5xx）后熔断 reset_timeout 秒，
+    期间请求直接抛 CircuitOpenError；到期后放行一个试探请求，成功即恢复，失败则继续熔断。
+    同时记录最近成功请求的耗时，供 HTTPPool 按 p95 决定何时发出对冲请求。
+    """
+
+    MIN_SAMPLES = 20
+    # 对冲请求最多占总请求数的比例，避免上游整体变慢时把压力翻倍
+    HEDGE_RATIO = 0.1
+
+    def __init__(self, host: str, failure_threshold: int, reset_timeout: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._probing = False
+        self._latencies: deque = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def check(self) -> None:
+        """请求前调用：熔断中抛 CircuitOpenError，到期后只放行一个试探请求"""
+        with self._lock:
+            self.requests += 1
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(f"{self.host} 熔断中，{max(remaining, 0):.0f} 秒后重试")
+            self._probing = True
+
+    def record(self, status_code: int, elapsed: float) -> None:
+        if status_code == 429 or status_code >= 500:
+            self.record_failure()
+            return
+        with self._lock:
+            if self.opened_at is not None:
+                print(f"[HTTP] {self.host} 恢复，关闭熔断")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+            self._latencies.append(elapsed)
+
+    def release_probe(self) -> None:
+        """请求因非网络原因中断（解码错误等）时调用：不计失败，只让下一个请求重新试探"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"[HTTP] {self.host} 连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f} 秒")
+                self.opened_at = time.monotonic()
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def hedge_delay(self) -> Optional[float]:
+        """样本足够且对冲预算未用完时返回等待多久再发第二个请求，否则返回 None"""
+        p95 = self.p95()
+        if p95 is None:
+            return None
+        with self._lock:
+            if self.opened_at is not None or self.hedges >= self.requests * self.HEDGE_RATIO:
+                return None
+        return max(p95, 0.05)
+
+    def note_hedge(self, won: bool = False) -> None:
+        with self._lock:
+            if won:
+                self.hedge_wins += 1
+            else:
+                self.hedges += 1
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "state": "closed" if self.opened_at is None else "open",
+            "failures": self.failures,
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+# 录制/回放涉及的上游域名；其他主机（如 Bark 推送）始终直连
+FIXTURE_DOMAINS = ("jisilu.cn", "tushare.pro", "eastmoney.com", "gtimg.cn")
+# 每次请求都会变化的时间戳参数，不参与 fixture 匹配
+VOLATILE_PARAMS = frozenset({"___jsl", "_"})
+DATE_VALUE_RE = re.compile(r"^\d{4}-?\d{2}-?\d{2}$")
+
+
+def _without_dates(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _without_dates(item) for key, item in value.items()
+            if not (isinstance(item, str) and DATE_VALUE_RE.match(item))
+        }
+    return value
+
+
+def fixture_keys(method: str, url: str, json_body: Optional[Dict] = None) -> Tuple[str, str]:
+    """
+    计算上游请求的 fixture 键：(精确键, 宽松键)。
+
+    忽略时间戳参数；宽松键再去掉日期类参数（如历史行情的起止日期），跨天回放时仍能命中。
+    json_body 是去掉 token 后的 JSON 请求体（Tushare）；表单请求体（登录）不参与匹配。
+    """
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in VOLATILE_PARAMS]
+    body = json_body or {}
+
+    def digest(pairs: List[Tuple[str, str]], payload: Any) -> str:
+        raw = json.dumps(
+            [method.upper(), parts.netloc, parts.path, sorted(pairs), payload],
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+    loose_query = [(k, v) for k, v in query if not DATE_VALUE_RE.match(v)]
+    return digest(query, body), digest(loose_query, _without_dates(body))
+
+
+def fixture_json_body(body: Any, content_type: str) -> Optional[Dict]:
+    """提取参与匹配的 JSON 请求体，去掉 token 等凭据"""
+    if not body or "json" not in (content_type or ""):
+        return None
+    try:
+        payload = json.loads(body)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    payload.pop("token", None)
+    return payload
+
+
+class UpstreamFixtures:
+    """
+    上游响应的录制与回放，用于离线压测和可复现的性能测量。
+
+    LOF_FIXTURE_RECORD=<目录>：把集思录、Tushare、东方财富、腾讯的真实响应按请求写成 JSON fixture；
+    LOF_UPSTREAM_REPLAY=<地址>：把这些主机的请求改写到本地替身服务器
+    （benchmarks/replay_server.py），由它按 fixture 应答并注入延迟和错误。
+    fixture 不保存请求里的 token/账号，登录响应只记录 Cookie 名称，回放时以占位值下发。
+    """
+
+    def __init__(self, record_dir: Optional[str] = None, replay_url: Optional[str] = None):
+        self.record_dir = os.environ.get("LOF_FIXTURE_RECORD", "") if record_dir is None else record_dir
+        replay = os.environ.get("LOF_UPSTREAM_REPLAY", "") if replay_url is None else replay_url
+        self.replay_url = replay.rstrip("/")
+
+    @staticmethod
+    def handles(host: str) -> bool:
+        return host.split(":")[0].endswith(FIXTURE_DOMAINS)
+
+    def rewrite(self, url: str) -> str:
+        """回放模式下把上游地址改写为 <替身服务器>/<原主机><原路径>"""
+        if not self.replay_url:
+            return url
+        parts = urlsplit(url)
+        if not self.handles(parts.netloc):
+            return url
+        query = f"?{parts.query}" if parts.query else ""
+        return f"{self.replay_url}/{parts.netloc}{parts.path}{query}"
+
+    def record(self, response: requests.Response) -> None:
+        request = response.request
+        host = urlsplit(request.url).netloc
+        if not self.record_dir or not self.handles(host) or response.status_code >= 400:
+            return
+        json_body = fixture_json_body(request.body, request.headers.get("Content-Type", ""))
+        exact, _ = fixture_keys(request.method, request.url, json_body)
+        entry = {
+            "method": request.method,
+            "url": request.url,
+            "json_body": json_body,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", ""),
+            "set_cookies": sorted(response.cookies.keys()),
+            "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "body": base64.b64encode(response.content).decode("ascii"),
+        }
+        directory = os.path.join(self.record_dir, host)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{exact}.json")
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            print(f"[FIXTURE] 录制失败 {request.url}: {exc}")
+
+
+class ResilientSession(requests.Session):
+    """挂在 HTTPPool 上的 Session：每个请求都经过所属主机的熔断和对冲逻辑"""
+
+    def __init__(self, pool: "HTTPPool"):
+        super().__init__()
+        self._pool = pool
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> requests.Response:
+        fixtures = self._pool.fixtures
+        target = fixtures.rewrite(url)
+        send = lambda: requests.Session.request(self, method, target, *args, **kwargs)  # noqa: E731
+        # 熔断和延迟统计按原上游主机计，回放时各上游仍互相隔离
+        response = self._pool.call(method, url, send)
+        if fixtures.record_dir:
+            fixtures.record(response)
+        return response
+
+
+class _HedgeState:
+    """
+    一次对冲的协调状态：首个请求在调用方线程发出，对冲请求在该主机的对冲线程里发出。
+
+    首个请求使用的连接登记在这里；对冲请求先成功时交出响应并关闭该连接的 socket，
+    调用方线程上阻塞的读随即失败，转而返回对冲结果。连接归还连接池前会先解除登记，
+    不会误关其他请求复用的连接。
+    """
+
+    def __init__(self):
+        self.first_done = threading.Event()
+        self._conn: Any = None
+        self._hedge_response: Optional[requests.Response] = None
+        self._lock = threading.Lock()
+
+    def attach(self, conn: Any) -> None:
+        with self._lock:
+            if not self.first_done.is_set():
+                self._conn = conn
+
+    def detach(self, conn: Any) -> None:
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+
+    def offer(self, response: requests.Response) -> bool:
+        """对冲请求成功时调用；首个请求已结束则返回 False"""
+        with self._lock:
+            if self.first_done.is_set():
+                return False
+            self._hedge_response = response
+            sock = getattr(self._conn, "sock", None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            return True
+
+    def finish_first(self) -> Optional[requests.Response]:
+        """首个请求结束（成功或失败）时调用，返回已到达的对冲响应"""
+        with self._lock:
+            self.first_done.set()
+            self._conn = None
+            response, self._hedge_response = self._hedge_response, None
+            return response
+
+
+class _ConnectionTracker(threading.local):
+    state: Optional[_HedgeState] = None
+
+
+# 调用方线程正在进行的对冲；连接池取出/归还连接时据此登记
+_CONNECTION_TRACKER = _ConnectionTracker()
+
+
+class _TrackedPoolMixin:
+    def _get_conn(self, timeout: Optional[float] = None):
+        conn = super()._get_conn(timeout)
+        state = _CONNECTION_TRACKER.state
+        if state is not None:
+            state.attach(conn)
+        return conn
+
+    def _put_conn(self, conn) -> None:
+        state = _CONNECTION_TRACKER.state
+        if state is not None:
+            state.detach(conn)
+        super()._put_conn(conn)
+
+
+class _TrackedHTTPConnectionPool(_TrackedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackedHTTPSConnectionPool(_TrackedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PoolAdapter(HTTPAdapter):
+    """连接池登记调用方线程正在使用的连接，对冲成功后可以中断落后的首个请求"""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TrackedHTTPConnectionPool,
+            "https": _TrackedHTTPSConnectionPool,
+        }
+
+
+class HTTPPool:
+    """
+    进程级共享的 keep-alive 连接池。
+
+    每个上游主机一个 HTTPAdapter（内部是 urllib3 连接池），所有 Session 挂载同一批 adapter，
+    跨请求复用 DNS/TCP/TLS 连接。Cookie 仍保存在各自的 Session 里，
+    因此 JisiluAPI 的登录态互相隔离，只共享底层连接。
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: Optional[int] = None,
+        retries: Optional[int] = None,
+        hedge: Optional[bool] = None,
+        fixtures: Optional[UpstreamFixtures] = None,
+    ):
+        self.pool_maxsize = max(1, pool_maxsize or env_int("HTTP_POOL_MAXSIZE", 16))
+        self.retries = max(0, env_int("HTTP_RETRIES", 1) if retries is None else retries)
+        # GET 请求超过该主机近期 p95 耗时仍未返回时，再发一个相同请求，先返回的为准
+        self.hedge = env_flag("HTTP_HEDGE", True) if hedge is None else hedge
+        # 每个主机同时在等待/发出的对冲请求上限；占满时新请求不对冲
+        self.hedge_workers = max(1, env_int("HTTP_HEDGE_WORKERS", 2))
+        self.breaker_failures = max(1, env_int("HTTP_BREAKER_FAILURES", 3))
+        self.breaker_reset = float(max(1, env_int("HTTP_BREAKER_RESET", 30)))
+        self.fixtures = fixtures or UpstreamFixtures()
+        self._adapters: Dict[str, HTTPAdapter] = {}
+        self._upstreams: Dict[str, UpstreamHealth] = {}
+        self._hedge_pools: Dict[str, Tuple[ThreadPoolExecutor, threading.Semaphore]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _build_retry(self) -> Retry:
+        # 只重试连接失败和网关类状态码；读超时不重试，避免把 10s 超时翻倍
+        return Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=0,
+            status=self.retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+
+    def adapter(self, prefix: str) -> HTTPAdapter:
+        with self._lock:
+            adapter = self._adapters.get(prefix)
+            if adapter is None:
+                adapter = _PoolAdapter(
+                    pool_connections=2 if prefix in UPSTREAM_PREFIXES else 10,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=self._build_retry(),
+                )
+                self._adapters[prefix] = adapter
+            return adapter
+
+    def session(self, cookies: bool = True) -> requests.Session:
+        """创建挂载共享连接池的新 Session；cookies=False 时不保存任何响应 Cookie"""
+        session = ResilientSession(self)
+        for prefix in ("http://", "https://") + UPSTREAM_PREFIXES:
+            session.mount(prefix, self.adapter(prefix))
+        if not cookies:
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    def _shared_session(self) -> requests.Session:
+        # 每个线程一个无 Cookie 的 Session，底层连接池仍是共享的
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self.session(cookies=False)
+        return session
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self._shared_session().get(url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self._shared_session().post(url, **kwargs)
+
+    def upstream(self, url: str) -> UpstreamHealth:
+        host = urlsplit(url).netloc
+        with self._lock:
+            health = self._upstreams.get(host)
+            if health is None:
+                health = self._upstreams[host] = UpstreamHealth(
+                    host, self.breaker_failures, self.breaker_reset
+                )
+            return health
+
+    def upstream_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            upstreams = list(self._upstreams.values())
+        return {health.host: health.stats() for health in upstreams}
+
+    def call(self, method: str, url: str, send: Callable[[], requests.Response]) -> requests.Response:
+        """经熔断检查后执行 send；幂等请求在有延迟样本时走对冲"""
+        health = self.upstream(url)
+        health.check()
+        if self.hedge and method.upper() in ("GET", "HEAD"):
+            return self._hedged(health, send)
+        return self._observed(health, send)
+
+    @staticmethod
+    def _observed(health: UpstreamHealth, send: Callable[[], requests.Response]) -> requests.Response:
+        started = time.perf_counter()
+        try:
+            response = send()
+        except requests.RequestException:
+            health.record_failure()
+            raise
+        except BaseException:
+            health.release_probe()
+            raise
+        health.record(response.status_code, time.perf_counter() - started)
+        return response
+
+    def _hedge_executor(self, host: str) -> Tuple[ThreadPoolExecutor, threading.Semaphore]:
+        with self._lock:
+            entry = self._hedge_pools.get(host)
+            if entry is None:
+                entry = self._hedge_pools[host] = (
+                    ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix=f"http-hedge-{host}"),
+                    threading.Semaphore(self.hedge_workers),
+                )
+            return entry
+
+    def _hedged(self, health: UpstreamHealth, send: Callable[[], requests.Response]) -> requests.Response:
+        """首个请求在调用方线程发出；超过 hedge_delay 仍未返回时由该主机的对冲线程再发一个"""
+        delay = health.hedge_delay()
+        if delay is None:
+            return self._observed(health, send)
+        executor, slots = self._hedge_executor(health.host)
+        if not slots.acquire(blocking=False):
+            return self._observed(health, send)
+
+        state = _HedgeState()
+        executor.submit(self._send_hedge, health, send, delay, state, slots)
+        _CONNECTION_TRACKER.state = state
+        started = time.perf_counter()
+        try:
+            response = send()
+        except requests.RequestException:
+            hedge_response = state.finish_first()
+            if hedge_response is not None:
+                # 首个请求是被对冲成功后主动中断的，不算上游失败
+                health.note_hedge(won=True)
+                return hedge_response
+            health.record_failure()
+            raise
+        except BaseException:
+            hedge_response = state.finish_first()
+            if hedge_response is not None:
+                hedge_response.close()
+            health.release_probe()
+            raise
+        finally:
+            _CONNECTION_TRACKER.state = None
+        hedge_response = state.finish_first()
+        if hedge_response is not None:
+            hedge_response.close()
+        health.record(response.status_code, time.perf_counter() - started)
+        return response
+
+    def _send_hedge(
+        self,
+        health: UpstreamHealth,
+        send: Callable[[], requests.Response],
+        delay: float,
+        state: _HedgeState,
+        slots: threading.Semaphore,
+    ) -> None:
+        try:
+            if state.first_done.wait(delay):
+                return
+            health.note_hedge()
+            try:
+                response = self._observed(health, send)
+            except requests.RequestException:
+                return
+            if not state.offer(response):
+                # 落后的对冲请求照常完成，只把连接还回连接池
+                response.close()
+        finally:
+            slots.release()
+
+
+HTTP_POOL = HTTPPool()
+
+
+def _flock(path: str, timeout: Optional[float] = None) -> Optional[int]:
+    """打开 path 并加排他锁；timeout 秒内拿不到锁返回 None，没有 fcntl 时也返回 None"""
+    if fcntl is None:
+        return None
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (fcntl.LOCK_NB if deadline is not None else 0))
+            return fd
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                return None
+            time.sleep(0.1)
+
+
+def _unlock(fd: Optional[int]) -> None:
+    if fd is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _atomic_write(path: str, data: bytes, mode: int = 0o600) -> None:
+    """先写同目录临时文件再 os.replace，读取方永远看到完整内容"""
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            os.fchmod(f.fileno(), mode)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# 放在当前用户私有的缓存目录（0700），不用共享的 /tmp：其他用户无法抢先创建文件注入 Cookie
+DEFAULT_COOKIE_CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "happy-lof",
+    "jisilu-cookie.json",
+)
+
+
+def _owned_privately(st: os.stat_result) -> bool:
+    """文件属于当前用户且其他用户不可读写；没有 getuid 的平台不检查"""
+    if not hasattr(os, "getuid"):
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+class CookieStore:
+    """
+    动态登录 Cookie 的跨进程缓存。
+
+    Cookie 按用户名保存在一个 JSON 文件里（权限 0600），默认位于当前用户的缓存目录；
+    不属于当前用户或权限宽于 0600 的文件一律不读。写入时先写临时文件再 os.replace，
+    读取方永远看到完整内容；进程内再按文件 mtime 缓存一份，未变化时不重复读盘。
+    gunicorn 多 worker 共用同一个文件：一个 worker 登录成功后，其余 worker（包括新启动的）
+    直接复用，不再各自请求登录接口。login_lock 保证同一时刻只有一个进程在执行登录；
+    登录失败次数和退避截止时间（login_state）也记在同一条目里，所有 worker 按同一个退避时刻重试。
+    path 为空字符串时退化为纯进程内缓存；非 Unix 平台没有 fcntl，只做原子写、不加文件锁。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        path = os.environ.get("JISILU_COOKIE_CACHE_FILE", DEFAULT_COOKIE_CACHE_FILE) if path is None else path
+        self.path = os.path.expanduser(path) if path else ""
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_dir(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _read_file(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+            with os.fdopen(fd, "r", encoding="utf-8") as f:
+                if not _owned_privately(os.fstat(f.fileno())):
+                    print(f"[COOKIE] 忽略 Cookie 缓存文件 {self.path}：不属于当前用户或权限宽于 0600")
+                    return {}
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            print(f"[COOKIE] 读取 Cookie 缓存文件失败: {exc}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _reload(self) -> None:
+        """文件 mtime 变化时重新读盘（调用方持有 self._lock）"""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns != self._mtime_ns:
+            self._entries = self._read_file()
+            self._mtime_ns = mtime_ns
+
+    def _write_file(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        _atomic_write(self.path, json.dumps(entries, ensure_ascii=False).encode("utf-8"))
+        self._mtime_ns = os.stat(self.path).st_mtime_ns
+
+    def _entry(self, username: str) -> Dict[str, Any]:
+        with self._lock:
+            if self.path:
+                self._reload()
+            return self._entries.get(username) or {}
+
+    def get(self, username: str, min_ttl: float = 0.0) -> str:
+        """返回至少还能用 min_ttl 秒的 Cookie，没有则返回空字符串"""
+        entry = self._entry(username)
+        if entry.get("cookie") and float(entry.get("expires_at") or 0) > time.time() + min_ttl:
+            return str(entry["cookie"])
+        return ""
+
+    def expires_at(self, username: str) -> float:
+        """缓存 Cookie 的过期时间戳，没有缓存时为 0"""
+        entry = self._entry(username)
+        return float(entry.get("expires_at") or 0) if entry.get("cookie") else 0.0
+
+    def login_state(self, username: str) -> Dict[str, Any]:
+        """连续登录失败次数、退避截止时间戳和最后一次错误，没有失败记录时均为空值"""
+        entry = self._entry(username)
+        return {
+            "failures": int(entry.get("failures") or 0),
+            "retry_at": float(entry.get("retry_at") or 0),
+            "last_error": str(entry.get("last_error") or ""),
+        }
+
+    def put(self, username: str, cookie: str, ttl: int) -> None:
+        """保存新 Cookie，同时清除登录失败记录"""
+        expires_at = time.time() + max(int(ttl), 60)
+        self._update(username, lambda entry: {"cookie": cookie, "expires_at": expires_at})
+
+    def discard(self, username: str, cookie: str) -> None:
+        """确认 Cookie 已失效时删除；缓存已被其他进程换成新 Cookie 时保持不变"""
+
+        def drop(entry: Dict[str, Any]) -> Dict[str, Any]:
+            if entry.get("cookie") != cookie:
+                return entry
+            return {key: value for key, value in entry.items() if key not in ("cookie", "expires_at")}
+
+        self._update(username, drop)
+
+    def record_login_failure(self, username: str, failures: int, retry_at: float, message: str) -> None:
+        """记录登录失败和退避截止时间；调用方应持有 login_lock，保证计数不被其他进程覆盖"""
+        self._update(
+            username,
+            lambda entry: dict(entry, failures=failures, retry_at=retry_at, last_error=message),
+        )
+
+    @staticmethod
+    def _live(entry: Any, now: float) -> bool:
+        # Cookie 过期且没有失败记录的条目可以清掉；失败次数要保留，退避才能逐次加长
+        return isinstance(entry, dict) and (
+            float(entry.get("expires_at") or 0) > now or bool(entry.get("failures"))
+        )
+
+    def _update(self, username: str, change: Callable[[Dict[str, Any]], Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._lock:
+            if not self.path:
+                self._set_entry(self._entries, username, change(self._entries.get(username) or {}))
+                return
+            fd = None
+            try:
+                self._ensure_dir()
+                fd = _flock(self.path + ".lock")
+                # 合并其他进程写入的用户名，顺带清掉过期项
+                entries = {name: item for name, item in self._read_file().items() if self._live(item, now)}
+                self._set_entry(entries, username, change(entries.get(username) or {}))
+                self._write_file(entries)
+                self._entries = entries
+            except OSError as exc:
+                print(f"[COOKIE] 写入 Cookie 缓存文件失败: {exc}")
+                self._set_entry(self._entries, username, change(self._entries.get(username) or {}))
+            finally:
+                _unlock(fd)
+
+    @staticmethod
+    def _set_entry(entries: Dict[str, Dict[str, Any]], username: str, entry: Dict[str, Any]) -> None:
+        if entry:
+            entries[username] = entry
+        else:
+            entries.pop(username, None)
+
+    def acquire_login(self, timeout: float) -> Optional[int]:
+        """获取跨进程登录锁，超时或不支持文件锁时返回 None（调用方照常登录）"""
+        if not self.path:
+            return None
+        try:
+            self._ensure_dir()
+            return _flock(self.path + ".login.lock", timeout)
+        except OSError as exc:
+            print(f"[COOKIE] 获取登录锁失败: {exc}")
+            return None
+
+    def release_login(self, handle: Optional[int]) -> None:
+        _unlock(handle)
+
+    @contextmanager
+    def login_lock(self, timeout: float):
+        handle = self.acquire_login(timeout)
+        try:
+            yield handle
+        finally:
+            self.release_login(handle)
+
+
+COOKIE_STORE = CookieStore()
+
 
 @dataclass
 class LOFInfo:
@@ -30,8 +820,111 @@ class LOFInfo:
     premium_source: str = ""  # "接口" | "估值" | "净值" | "无"
 
 
-class JisiluAPI:
-    """集思录 API 封装类"""
+_MISSING_VALUES = frozenset(("", "-", "--"))
+
+
+def _parse_number(value: Any) -> Optional[float]:
+    """
+    解析集思录数值字段（价格、百分比、带千分位的金额），缺失或占位符返回 None。
+
+    None 与 0.0 分开返回，用来区分“字段被屏蔽”和“确为 0”；常见输入不走异常分支。
+    """
+    if value is None:
+        return None
+    if value.__class__ is float or value.__class__ is int:
+        return float(value)
+    text = str(value).strip()
+    if text in _MISSING_VALUES:
+        return None
+    if text[-1] == "%":
+        text = text[:-1].rstrip()
+    if "," in text:
+        text = text.replace(",", "")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class RowSpec:
+    """
+    分类行解析规格。
+
+    premium_keys：接口溢价率字段，按顺序取第一个有值的；
+    prefer_estimate：接口溢价率缺失时，优先用估值（True）还是净值（False）自算。
+    """
+    premium_keys: Tuple[str, ...]
+    prefer_estimate: bool
+
+
+LOF_ROW_SPEC = RowSpec(premium_keys=("discount_rt",), prefer_estimate=True)
+# QDII 接口溢价率字段可能是 discount_rt 或 t1_premium_rate
+QDII_ROW_SPEC = RowSpec(premium_keys=("discount_rt", "t1_premium_rate"), prefer_estimate=False)
+
+
+def parse_rows(rows: List[Dict], spec: RowSpec, fund_type: str) -> List[LOFInfo]:
+    """
+    按列规格把集思录 rows 解析为 LOFInfo 列表，每个字段只解析一次。
+
+    溢价率优先级：
+    1. 接口自带溢价率非空 -> 直接使用（后向兼容集思录字段恢复）
+    2. 按 prefer_estimate 顺序挑参考净值并用 price 自算
+    3. 都不可用 -> (0.0, "无")
+    """
+    parse = _parse_number
+    premium_keys = spec.premium_keys
+    prefer_estimate = spec.prefer_estimate
+    result = []
+    append = result.append
+    for row in rows:
+        try:
+            get = (row.get("cell") or {}).get
+            price = parse(get("price")) or 0.0
+            estimate_value = parse(get("estimate_value")) or 0.0
+            fund_nav = parse(get("fund_nav")) or 0.0
+
+            premium_rate = None
+            for key in premium_keys:
+                premium_rate = parse(get(key))
+                if premium_rate is not None:
+                    break
+
+            if premium_rate is not None:
+                premium_source = "接口"
+            else:
+                premium_rate, premium_source = 0.0, "无"
+                if price > 0:
+                    if prefer_estimate:
+                        candidates = (("估值", estimate_value), ("净值", fund_nav))
+                    else:
+                        candidates = (("净值", fund_nav), ("估值", estimate_value))
+                    for label, ref in candidates:
+                        if ref > 0:
+                            premium_rate, premium_source = (price / ref - 1) * 100, label
+                            break
+
+            append(LOFInfo(
+                get("fund_id", ""),
+                get("fund_nm", ""),
+                price,
+                parse(get("increase_rt")) or 0.0,
+                fund_nav or estimate_value,
+                premium_rate,
+                parse(get("volume")) or 0.0,
+                get("apply_status", ""),
+                fund_type,
+                estimate_value,
+                get("fund_nav_dt", "") or get("nav_dt", ""),
+                premium_source,
+            ))
+        except Exception as e:
+            print(f"解析 {fund_type} 失败: {e}")
+    return result
+
+
+class _JisiluBase:
+    """集思录客户端公共部分：配置、Cookie 缓存、鉴权判断和数据解析，同步/异步版本共用"""
     
     BASE_URL = "https://www.jisilu.cn"
     # 经验阈值：正常登录态下 index_lof 行数通常远高于游客态
@@ -39,11 +932,11 @@ class JisiluAPI:
     LOGIN_PAGE = "/login/"
     LOGIN_ENDPOINT = "/webapi/account/login_process/"
     LOGIN_KEY_RE = re.compile(r"var\s+key\s*=\s*'([^']+)'")
-    _cookie_cache_lock = threading.Lock()
-    _cookie_cache: Dict[str, Any] = {
-        "username": "",
-        "cookie": "",
-        "expires_at": 0.0,
+    DEFAULT_HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Accept": "application/json, text/javascript, */*; q=0.01",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+        "X-Requested-With": "XMLHttpRequest",
     }
     
     ENDPOINTS = {
@@ -52,6 +945,22 @@ class JisiluAPI:
         "qdii_lof": "/data/qdii/qdii_list/E",
         "qdii_commodity": "/data/qdii/qdii_list/C",  # 商品型QDII（原油、黄金等）
     }
+
+    # 分类抓取顺序与参数：(分类, Referer 路径, 额外参数, 解析器, fund_type)
+    CATEGORY_SPECS = (
+        ("index_lof", "/data/lof/", None, "lof", "指数LOF"),
+        ("stock_lof", "/data/lof/", None, "lof", "股票LOF"),
+        ("qdii_lof", "/data/qdii/", {"only_lof": "y"}, "qdii", "QDII"),
+        ("qdii_commodity", "/data/qdii/", {"only_lof": "y"}, "qdii", "QDII"),
+    )
+    CATEGORY_NAMES = tuple(spec[0] for spec in CATEGORY_SPECS)
+
+    # 最近确认有效的 Cookie 在这段时间内跳过 index_lof 探测，四个分类直接并发抓取
+    AUTH_VERIFIED_TTL = 300
+    _auth_lock = threading.Lock()
+    _auth_verified: Dict[str, float] = {}
+    # 各分类最近一次登录态下的行数，用来判断哪些分类拿到的是游客截断数据
+    _authed_row_counts: Dict[str, int] = {}
     
     def __init__(
         self,
@@ -59,23 +968,31 @@ class JisiluAPI:
         username: Optional[str] = None,
         password: Optional[str] = None,
         timeout: int = 10,
+        cookie_store: Optional[CookieStore] = None,
+        cookie_renewer: Optional["CookieRenewer"] = None,
     ):
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-            "X-Requested-With": "XMLHttpRequest",
-        })
-        
         # 优先使用动态登录凭据，静态 Cookie 作为兜底。
         self.cookie = cookie or os.environ.get("JISILU_COOKIE", "")
         self.username = username or os.environ.get("JISILU_USERNAME", "")
         self.password = password or os.environ.get("JISILU_PASSWORD", "")
         self.cookie_cache_ttl = self._parse_int(os.environ.get("JISILU_COOKIE_CACHE_TTL")) or 3600
+        # 动态 Cookie 默认进程间共享（见 CookieStore），多个 worker 只需登录一次
+        self.cookie_store = cookie_store or COOKIE_STORE
+        # 配置续期器后登录全部交给后台线程，抓取时只读缓存、不内联登录
+        self.cookie_renewer = cookie_renewer
         self.timeout = timeout
+        # 分页：单页行数、单个分类最多页数、同时在途的分页请求数（对集思录保持克制）
+        self.page_size = max(1, env_int("JISILU_PAGE_SIZE", 500))
+        self.max_pages = max(1, env_int("JISILU_MAX_PAGES", 10))
+        self.max_pages_in_flight = max(1, env_int("JISILU_MAX_PAGES_IN_FLIGHT", 2))
+        self.fetch_stats: Dict[str, Dict[str, Any]] = {}
+        self._request_errors: Dict[str, str] = {}
+        self._upstream_requests = 0
+        self._counter_lock = threading.Lock()
+        self._relogin_attempted = False
         self.auth_source = "static_cookie" if self.cookie else "none"
         self.login_message = ""
+        self.login_captcha = False
         self._login_attempted = False
         if self.cookie:
             self._set_cookie_header(self.cookie)
@@ -101,16 +1018,15 @@ class JisiluAPI:
             return None
 
     def _set_cookie_header(self, cookie: str) -> None:
-        self.cookie = cookie or ""
-        if self.cookie:
-            self.session.headers.update({"Cookie": self.cookie})
-        else:
-            self.session.headers.pop("Cookie", None)
+        raise NotImplementedError
+
+    def _cookie_jar(self):
+        raise NotImplementedError
 
     def _session_cookie_header(self) -> str:
         return "; ".join(
             f"{cookie.name}={cookie.value}"
-            for cookie in self.session.cookies
+            for cookie in self._cookie_jar()
             if cookie.value is not None
         )
 
@@ -141,27 +1057,19 @@ class JisiluAPI:
     def _cached_cookie(self) -> str:
         if not self.username:
             return ""
-        now = time.time()
-        with self._cookie_cache_lock:
-            if (
-                self._cookie_cache.get("username") == self.username
-                and self._cookie_cache.get("cookie")
-                and float(self._cookie_cache.get("expires_at") or 0) > now
-            ):
-                return str(self._cookie_cache["cookie"])
-        return ""
+        return self.cookie_store.get(self.username)
 
     def _store_cached_cookie(self, cookie: str) -> None:
         if not self.username or not cookie:
             return
-        with self._cookie_cache_lock:
-            self._cookie_cache.update({
-                "username": self.username,
-                "cookie": cookie,
-                "expires_at": time.time() + max(int(self.cookie_cache_ttl), 60),
-            })
+        self.cookie_store.put(self.username, cookie, self.cookie_cache_ttl)
 
-    def login(self) -> bool:
+    def _login_lock_timeout(self) -> float:
+        # 持锁进程最多花两个请求超时完成登录，等待方再多留一点余量
+        return self.timeout * 2 + 5
+
+    def _login_precheck(self) -> Optional[bool]:
+        """登录前置检查：返回 True/False 表示无需请求即可结束，None 表示需要走登录流程"""
         if not self.can_dynamic_login():
             self.login_message = "未配置 JISILU_USERNAME/JISILU_PASSWORD，无法动态登录"
             return False
@@ -172,56 +1080,43 @@ class JisiluAPI:
             self.auth_source = "dynamic_cache"
             self.login_message = "已复用动态登录 Cookie 缓存"
             return True
+        return None
 
-        previous_cookie = self.cookie
-        previous_auth_source = self.auth_source
-        self.session.headers.pop("Cookie", None)
-        self.session.cookies.clear()
-
-        login_page_url = f"{self.BASE_URL}{self.LOGIN_PAGE}"
-        response = self.session.get(
-            login_page_url,
-            headers={"Referer": self.BASE_URL},
-            timeout=self.timeout,
-        )
-        response.raise_for_status()
-        match = self.LOGIN_KEY_RE.search(response.text)
+    def _login_form(self, login_page_text: str) -> Optional[Dict[str, str]]:
+        match = self.LOGIN_KEY_RE.search(login_page_text)
         if not match:
-            self._set_cookie_header(previous_cookie)
-            self.auth_source = previous_auth_source
-            self.login_message = "集思录登录页未找到 AES key"
-            return False
-
+            return None
         aes_key = match.group(1)
-        data = {
+        return {
             "return_url": f"{self.BASE_URL}/data/lof/",
             "user_name": self._jslencode(self.username, aes_key),
             "password": self._jslencode(self.password, aes_key),
             "aes": "1",
             "auto_login": "1",
         }
-        login_response = self.session.post(
-            f"{self.BASE_URL}{self.LOGIN_ENDPOINT}",
-            data=data,
-            headers={"Referer": login_page_url},
-            timeout=self.timeout,
-        )
-        login_response.raise_for_status()
-        payload = login_response.json()
+
+    def _restore_login_state(self, previous_cookie: str, previous_auth_source: str, message: str) -> bool:
+        self._set_cookie_header(previous_cookie)
+        self.auth_source = previous_auth_source
+        self.login_message = message
+        return False
+
+    def _finish_login(self, payload: Dict, previous_cookie: str, previous_auth_source: str) -> bool:
+        """根据登录接口返回值收尾：成功则写入 Cookie 缓存，失败则恢复原有 Cookie"""
         if payload.get("code") != 200:
-            captcha = bool((payload.get("data") or {}).get("captcha"))
+            captcha = self.login_captcha = bool((payload.get("data") or {}).get("captcha"))
             suffix = "；需要验证码，已降级使用现有 Cookie/游客态" if captcha else ""
-            self._set_cookie_header(previous_cookie)
-            self.auth_source = previous_auth_source
-            self.login_message = f"动态登录失败：{payload.get('msg') or '未知错误'}{suffix}"
-            return False
+            return self._restore_login_state(
+                previous_cookie,
+                previous_auth_source,
+                f"动态登录失败：{payload.get('msg') or '未知错误'}{suffix}",
+            )
 
         cookie = self._session_cookie_header()
         if not cookie:
-            self._set_cookie_header(previous_cookie)
-            self.auth_source = previous_auth_source
-            self.login_message = "动态登录成功但未获取到 Cookie"
-            return False
+            return self._restore_login_state(
+                previous_cookie, previous_auth_source, "动态登录成功但未获取到 Cookie"
+            )
 
         self._set_cookie_header(cookie)
         self._store_cached_cookie(cookie)
@@ -229,36 +1124,80 @@ class JisiluAPI:
         self.login_message = "动态登录成功"
         return True
 
-    def _ensure_dynamic_cookie(self) -> None:
-        if self.has_auth_cookie() or not self.can_dynamic_login() or self._login_attempted:
+    def _renew_in_background(self, stale_cookie: str = "") -> bool:
+        """把登录交给后台续期线程；返回 False 表示未配置续期器，调用方照常内联登录"""
+        if self.cookie_renewer is None or not self.can_dynamic_login():
+            return False
+        self.cookie_renewer.watch(self.username, self.password)
+        if stale_cookie:
+            self.cookie_renewer.renew(self.username, stale_cookie)
+        state = self.cookie_renewer.describe(self.username)
+        self.auth_status["renewal"] = state
+        if stale_cookie or not self.has_auth_cookie():
+            self.login_message = state.get("last_error") or "动态登录已转入后台，本次使用现有 Cookie/游客态"
+        return True
+
+    def _use_renewed_cookie(self) -> None:
+        """后台续期模式下抓取前只读缓存：有动态 Cookie 就优先使用，没有则交给后台登录"""
+        if not self.can_dynamic_login() or self._login_attempted:
             return
         self._login_attempted = True
-        try:
-            self.login()
-        except Exception as exc:
-            if self.cookie:
-                self._set_cookie_header(self.cookie)
-            self.login_message = f"动态登录异常：{exc}"
-
-    def _make_request(self, endpoint: str, referer: str, params: Optional[Dict] = None) -> Dict:
-        url = f"{self.BASE_URL}{endpoint}"
-        self.session.headers["Referer"] = referer
-        
+        if not self._login_precheck():
+            self._renew_in_background()
+
+    def _stale_dynamic_cookie(self) -> str:
+        return self.cookie if self.auth_source in ("dynamic_cache", "dynamic_login") else ""
+
+    def _login_failed(self, exc: Exception) -> None:
+        if self.cookie:
+            self._set_cookie_header(self.cookie)
+        self.login_message = f"动态登录异常：{exc}"
+
+    def _append_login_message(self) -> None:
+        self.auth_status["login_message"] = self.login_message
+        if self.login_message and self.login_message not in self.auth_status["message"]:
+            self.auth_status["message"] = f"{self.auth_status['message']}；{self.login_message}"
+
+    def _page_params(self, params: Optional[Dict], page: int) -> Dict[str, str]:
         request_params = {
             "___jsl": self._get_timestamp(),
-            "rp": "500",
-            "page": "1",
+            "rp": str(self.page_size),
+            "page": str(page),
         }
         if params:
             request_params.update(params)
-        
-        try:
-            response = self.session.get(url, params=request_params, timeout=self.timeout)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"请求失败: {e}")
-            return {"rows": []}
+        return request_params
+
+    def _remaining_pages(self, endpoint: str, first: Dict) -> int:
+        """根据首页 total 计算总页数；以首页实际行数为准，兼容服务端对 rp 的上限裁剪"""
+        rows = first.get("rows") or []
+        total = self._parse_int(first.get("total")) or 0
+        if not rows or total <= len(rows):
+            return 1
+        page_count = -(-total // len(rows))
+        if page_count > self.max_pages:
+            print(f"[PAGE] {endpoint} 共 {page_count} 页，超过上限 {self.max_pages}，仅抓取前 {self.max_pages} 页")
+            page_count = self.max_pages
+        return page_count
+
+    def _parse_category(self, parser: str, fund_type: str, data: Dict) -> List[LOFInfo]:
+        if parser == "qdii":
+            return self._parse_qdii_data(data, fund_type=fund_type)
+        return self._parse_lof_data(data, fund_type)
+
+    def _record_fetch(self, name: str, rows: List[LOFInfo], started: float, error: str) -> None:
+        self.fetch_stats[name] = {
+            "rows": len(rows),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "error": error or self._request_errors.get(self.ENDPOINTS[name], ""),
+        }
+
+    def _fetch_summary(self, mode: str, started: float) -> None:
+        self.auth_status["fetch"] = {
+            "mode": mode,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "endpoints": dict(self.fetch_stats),
+        }
 
     def _check_auth_status(self, index_rows: int) -> Dict[str, Any]:
         """根据指数LOF条数粗略判断是否退化到游客态"""
@@ -292,239 +1231,1755 @@ class JisiluAPI:
                 "message": f"cookie 看起来有效（index_lof={index_rows}）",
                 **base,
             }
+            with self._auth_lock:
+                if len(self._auth_verified) > 16:
+                    self._auth_verified.clear()
+                self._auth_verified[self.cookie] = time.time()
 
         if self.login_message and self.login_message not in self.auth_status["message"]:
             self.auth_status["message"] = f"{self.auth_status['message']}；{self.login_message}"
 
         return self.auth_status
 
-    def get_auth_status(self) -> Dict[str, Any]:
-        return self.auth_status
+    def _count_request(self) -> None:
+        with self._counter_lock:
+            self._upstream_requests += 1
 
-    def _parse_percentage(self, value: Any) -> float:
-        if value is None:
-            return 0.0
-        if isinstance(value, (int, float)):
-            return float(value)
-        try:
-            clean_value = str(value).replace("%", "").replace(" ", "").strip()
-            if clean_value in ("", "-", "--"):
-                return 0.0
-            return float(clean_value)
-        except:
-            return 0.0
-
-    def _parse_float(self, value: Any) -> float:
-        if value is None:
-            return 0.0
-        try:
-            clean_value = str(value).replace(",", "").strip()
-            if clean_value in ("", "-", "--"):
-                return 0.0
-            return float(clean_value)
-        except:
-            return 0.0
-
-    def _has_value(self, raw: Any) -> bool:
-        """原始字段是否确实有值（区分'字段被屏蔽'与'确为 0'）"""
-        if raw is None:
+    def _begin_refresh(self) -> None:
+        self.fetch_stats = {}
+        self._request_errors = {}
+        self._upstream_requests = 0
+        self._relogin_attempted = False
+
+    def _auth_known_good(self) -> bool:
+        """当前 Cookie 最近刚通过 index_lof 校验时无需再探测"""
+        with self._auth_lock:
+            verified_at = self._auth_verified.get(self.cookie)
+        return bool(self.cookie) and verified_at is not None and time.time() - verified_at < self.AUTH_VERIFIED_TTL
+
+    def _should_probe(self) -> bool:
+        """
+        只有可能在本次请求内联重新登录时才值得先单独探测 index_lof；
+        没有账号密码或登录交给后台续期线程时，探测只多一次串行往返，直接四类并发抓取。
+        """
+        return self.can_dynamic_login() and self.cookie_renewer is None and not self._auth_known_good()
+
+    def _needs_login(self) -> bool:
+        return (
+            self.auth_status.get("status") != "ok"
+            and self.can_dynamic_login()
+            and not self._relogin_attempted
+        )
+
+    def _relogin_precheck(self) -> Optional[bool]:
+        """鉴权不通过时的登录前置判断：False 表示本次请求不登录，None 表示需要内联登录"""
+        self._relogin_attempted = True
+        if self.auth_source == "dynamic_login":
+            # 本次请求刚登录过，再登录也拿不到更多数据
+            self._append_login_message()
             return False
-        s = str(raw).replace("%", "").replace(",", "").strip()
-        return s not in ("", "-", "--")
+        if self._renew_in_background(self._stale_dynamic_cookie()):
+            self._append_login_message()
+            return False
+        if self.auth_source == "dynamic_cache":
+            # 缓存里的 Cookie 已失效，丢弃后 login() 才会真正请求登录
+            self.cookie_store.discard(self.username, self.cookie)
+        return None
+
+    def _guest_truncated(self, results: Dict[str, List[LOFInfo]]) -> List[str]:
+        """登录前已抓到的分类中，行数明显少于登录态的（可能被游客截断）需要登录后重抓"""
+        with self._auth_lock:
+            known = dict(self._authed_row_counts)
+        return [
+            name for name, rows in results.items()
+            if name == "index_lof" or name not in known or len(rows) < known[name] // 2
+        ]
+
+    def _finish_refresh(
+        self, results: Dict[str, List[LOFInfo]], mode: str, started: float, probed: bool
+    ) -> List[LOFInfo]:
+        self._fetch_summary(mode, started)
+        self.auth_status["fetch"]["auth_probe"] = probed
+        if self.auth_status.get("status") == "ok":
+            with self._auth_lock:
+                for name, rows in results.items():
+                    if not self.fetch_stats.get(name, {}).get("error"):
+                        self._authed_row_counts[name] = len(rows)
+            self._renew_in_background()
+        self.auth_status["upstream_requests"] = self._upstream_requests
+        return [lof for name in self.CATEGORY_NAMES for lof in results.get(name, [])]
+
+    def get_auth_status(self) -> Dict[str, Any]:
+        return self.auth_status
+
+    def _parse_lof_data(self, data: Dict, fund_type: str) -> List[LOFInfo]:
+        return parse_rows(data.get("rows", []), LOF_ROW_SPEC, fund_type)
+
+    def _parse_qdii_data(self, data: Dict, fund_type: str = "QDII") -> List[LOFInfo]:
+        return parse_rows(data.get("rows", []), QDII_ROW_SPEC, fund_type)
+
+
+class JisiluAPI(_JisiluBase):
+    """集思录 API 封装类"""
+    
+    def __init__(
+        self,
+        cookie: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        timeout: int = 10,
+        parallel_fetch: Optional[bool] = None,
+        max_workers: Optional[int] = None,
+        http_pool: Optional[HTTPPool] = None,
+        cookie_store: Optional[CookieStore] = None,
+        cookie_renewer: Optional["CookieRenewer"] = None,
+    ):
+        # 连接池进程内共享，Cookie/登录态留在本实例自己的 Session 中
+        self.session = (http_pool or HTTP_POOL).session()
+        self.session.headers.update(self.DEFAULT_HEADERS)
+        # 四个分类接口互不依赖，默认并发抓取；JISILU_PARALLEL_FETCH=0 可退回串行
+        self.parallel_fetch = (
+            env_flag("JISILU_PARALLEL_FETCH", True) if parallel_fetch is None else parallel_fetch
+        )
+        self.max_workers = max(1, max_workers or env_int("JISILU_FETCH_WORKERS", 4))
+        super().__init__(
+            cookie=cookie,
+            username=username,
+            password=password,
+            timeout=timeout,
+            cookie_store=cookie_store,
+            cookie_renewer=cookie_renewer,
+        )
+        # 分页请求的在途上限由各分类共用，并发抓取四个分类时总数仍不超过 max_pages_in_flight
+        self._page_slots = threading.BoundedSemaphore(self.max_pages_in_flight)
+
+    def _set_cookie_header(self, cookie: str) -> None:
+        self.cookie = cookie or ""
+        if self.cookie:
+            self.session.headers.update({"Cookie": self.cookie})
+        else:
+            self.session.headers.pop("Cookie", None)
+
+    def _cookie_jar(self):
+        return self.session.cookies
+
+    def login(self) -> bool:
+        done = self._login_precheck()
+        if done is not None:
+            return done
+
+        with self.cookie_store.login_lock(self._login_lock_timeout()):
+            # 等锁期间其他 worker 可能已经登录并写入了缓存
+            done = self._login_precheck()
+            if done is not None:
+                return done
+            return self._login_request()
+
+    def _login_request(self) -> bool:
+        previous_cookie = self.cookie
+        previous_auth_source = self.auth_source
+        self.session.headers.pop("Cookie", None)
+        self.session.cookies.clear()
+
+        login_page_url = f"{self.BASE_URL}{self.LOGIN_PAGE}"
+        self._count_request()
+        response = self.session.get(
+            login_page_url,
+            headers={"Referer": self.BASE_URL},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = self._login_form(response.text)
+        if data is None:
+            return self._restore_login_state(
+                previous_cookie, previous_auth_source, "集思录登录页未找到 AES key"
+            )
+
+        self._count_request()
+        login_response = self.session.post(
+            f"{self.BASE_URL}{self.LOGIN_ENDPOINT}",
+            data=data,
+            headers={"Referer": login_page_url},
+            timeout=self.timeout,
+        )
+        login_response.raise_for_status()
+        return self._finish_login(login_response.json(), previous_cookie, previous_auth_source)
+
+    def _ensure_dynamic_cookie(self) -> None:
+        if self.cookie_renewer is not None:
+            self._use_renewed_cookie()
+            return
+        if self.has_auth_cookie() or not self.can_dynamic_login() or self._login_attempted:
+            return
+        self._login_attempted = True
+        try:
+            self.login()
+        except Exception as exc:
+            self._login_failed(exc)
+
+    def _request_page(self, endpoint: str, referer: str, params: Optional[Dict], page: int) -> Dict:
+        # Referer 按请求传入，避免并发抓取时互相覆盖 session 级请求头
+        self._count_request()
+        response = self.session.get(
+            f"{self.BASE_URL}{endpoint}",
+            params=self._page_params(params, page),
+            headers={"Referer": referer},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
 
-    def _compute_premium(
+    def _make_request(
         self,
-        cell: Dict,
-        price: float,
-        api_premium_raw: Any,
-        prefer_estimate: bool,
-    ) -> (float, str):
+        endpoint: str,
+        referer: str,
+        params: Optional[Dict] = None,
+        on_page: Optional[Callable[[int, List[Dict]], None]] = None,
+    ) -> Dict:
         """
-        计算溢价率，返回 (premium_rate, source_label)。
+        请求一个分类的全部分页。
 
-        优先级：
-        1. 接口自带溢价率非空 -> 直接使用（后向兼容集思录字段恢复）
-        2. 按 prefer_estimate 顺序挑参考净值并用 price 自算
-        3. 都不可用 -> (0.0, "无")
+        首页返回 total 后，剩余分页以有限并发抓取；每到达一页就回调 on_page(page, rows)，
+        返回值按页码顺序合并全部 rows。
         """
-        if self._has_value(api_premium_raw):
-            return self._parse_percentage(api_premium_raw), "接口"
+        try:
+            first = self._request_page(endpoint, referer, params, 1)
+        except Exception as e:
+            print(f"请求失败: {e}")
+            self._request_errors[endpoint] = str(e)
+            return {"rows": []}
 
-        estimate = self._parse_float(cell.get("estimate_value"))
-        fund_nav = self._parse_float(cell.get("fund_nav"))
+        rows = first.get("rows") or []
+        if on_page:
+            on_page(1, rows)
 
-        candidates = (
-            [("估值", estimate), ("净值", fund_nav)]
-            if prefer_estimate
-            else [("净值", fund_nav), ("估值", estimate)]
-        )
+        page_count = self._remaining_pages(endpoint, first)
+        if page_count <= 1:
+            return first
 
-        if price > 0:
-            for label, ref in candidates:
-                if ref > 0:
-                    return (price / ref - 1) * 100, label
+        pages: Dict[int, List[Dict]] = {1: rows}
+        workers = min(self.max_pages_in_flight, page_count - 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jisilu-page") as pool:
+            futures = {
+                pool.submit(self._request_extra_page, endpoint, referer, params, page): page
+                for page in range(2, page_count + 1)
+            }
+            for future in as_completed(futures):
+                page = futures[future]
+                try:
+                    page_rows = future.result().get("rows") or []
+                except Exception as e:
+                    print(f"分页请求失败 {endpoint} page={page}: {e}")
+                    self._request_errors[endpoint] = f"page {page}: {e}"
+                    continue
+                pages[page] = page_rows
+                if on_page:
+                    on_page(page, page_rows)
 
-        return 0.0, "无"
+        merged = dict(first)
+        merged["rows"] = [row for page in sorted(pages) for row in pages[page]]
+        return merged
+
+    def _request_extra_page(self, endpoint: str, referer: str, params: Optional[Dict], page: int) -> Dict:
+        with self._page_slots:
+            return self._request_page(endpoint, referer, params, page)
+
+    def _fetch_parsed(
+        self,
+        endpoint: str,
+        referer: str,
+        parse: Callable[[Dict], List[LOFInfo]],
+        params: Optional[Dict] = None,
+    ) -> Tuple[List[LOFInfo], int]:
+        """抓取并逐页解析，返回 (按页码排序的解析结果, 原始行数)"""
+        parsed: Dict[int, List[LOFInfo]] = {}
+
+        def on_page(page: int, rows: List[Dict]) -> None:
+            parsed[page] = parse({"rows": rows})
+
+        data = self._make_request(endpoint, referer, params, on_page=on_page)
+        result = [lof for page in sorted(parsed) for lof in parsed[page]]
+        return result, len(data.get("rows", []))
+
+    def _fetch_category(self, name: str) -> Tuple[List[LOFInfo], int]:
+        for spec_name, referer_path, params, parser, fund_type in self.CATEGORY_SPECS:
+            if spec_name == name:
+                return self._fetch_parsed(
+                    self.ENDPOINTS[name],
+                    referer=f"{self.BASE_URL}{referer_path}",
+                    parse=lambda data: self._parse_category(parser, fund_type, data),
+                    params=params,
+                )
+        raise KeyError(name)
 
     def get_index_lof(self) -> List[LOFInfo]:
         self._ensure_dynamic_cookie()
-        data = self._make_request(
-            self.ENDPOINTS["index_lof"],
-            referer=f"{self.BASE_URL}/data/lof/"
-        )
-        rows = data.get("rows", [])
-        self._check_auth_status(len(rows))
-        return self._parse_lof_data(data, "指数LOF")
+        result, row_count = self._fetch_category("index_lof")
+        self._check_auth_status(row_count)
+        return result
 
     def get_stock_lof(self) -> List[LOFInfo]:
         """获取股票型 LOF 数据"""
-        data = self._make_request(
-            self.ENDPOINTS["stock_lof"],
-            referer=f"{self.BASE_URL}/data/lof/"
-        )
-        return self._parse_lof_data(data, "股票LOF")
+        return self._fetch_category("stock_lof")[0]
 
     def get_qdii_lof(self) -> List[LOFInfo]:
-        data = self._make_request(
-            self.ENDPOINTS["qdii_lof"],
-            referer=f"{self.BASE_URL}/data/qdii/",
-            params={"only_lof": "y"}
-        )
-        return self._parse_qdii_data(data)
+        return self._fetch_category("qdii_lof")[0]
 
     def get_qdii_commodity(self) -> List[LOFInfo]:
         """获取 QDII 商品基金数据（原油、黄金等）"""
-        data = self._make_request(
-            self.ENDPOINTS["qdii_commodity"],
-            referer=f"{self.BASE_URL}/data/qdii/",
-            params={"only_lof": "y"}
-        )
-        return self._parse_qdii_data(data, fund_type="QDII")
+        return self._fetch_category("qdii_commodity")[0]
 
-    def _parse_lof_data(self, data: Dict, fund_type: str) -> List[LOFInfo]:
-        result = []
-        for row in data.get("rows", []):
-            cell = row.get("cell", {})
-            try:
-                price = self._parse_float(cell.get("price"))
-                estimate_value = self._parse_float(cell.get("estimate_value"))
-                fund_nav = self._parse_float(cell.get("fund_nav"))
-                net_value = fund_nav or estimate_value
-                premium_rate, premium_source = self._compute_premium(
-                    cell, price, cell.get("discount_rt"), prefer_estimate=True
-                )
-                lof = LOFInfo(
-                    fund_id=cell.get("fund_id", ""),
-                    fund_name=cell.get("fund_nm", ""),
-                    price=price,
-                    change_pct=self._parse_percentage(cell.get("increase_rt")),
-                    net_value=net_value,
-                    premium_rate=premium_rate,
-                    volume=self._parse_float(cell.get("volume")),
-                    apply_status=cell.get("apply_status", ""),
-                    fund_type=fund_type,
-                    estimate_value=estimate_value,
-                    nav_date=cell.get("fund_nav_dt", "") or cell.get("nav_dt", ""),
-                    premium_source=premium_source,
-                )
-                result.append(lof)
-            except Exception as e:
-                print(f"解析失败: {e}")
-        return result
+    def get_all_lof(self) -> List[LOFInfo]:
+        self._begin_refresh()
+        # 动态登录会重置 session Cookie，必须在并发抓取之前完成
+        self._ensure_dynamic_cookie()
+        started = time.perf_counter()
+        probed = self._should_probe()
+        if probed:
+            # 登录态未确认：先单独抓 index_lof 校验，需要登录时只重抓这一个分类
+            results = self._fetch_categories(("index_lof",))
+            if self._needs_login() and self._relogin():
+                results.update(self._fetch_categories(("index_lof",)))
+            results.update(self._fetch_categories(self.CATEGORY_NAMES[1:]))
+        else:
+            results = self._fetch_categories(self.CATEGORY_NAMES)
+        if self._needs_login() and self._relogin():
+            results.update(self._fetch_categories(tuple(self._guest_truncated(results))))
+        mode = "parallel" if self.parallel_fetch and self.max_workers > 1 else "serial"
+        return self._finish_refresh(results, mode, started, probed)
 
-    def _parse_qdii_data(self, data: Dict, fund_type: str = "QDII") -> List[LOFInfo]:
-        result = []
-        for row in data.get("rows", []):
-            cell = row.get("cell", {})
+    def _relogin(self) -> bool:
+        done = self._relogin_precheck()
+        if done is not None:
+            return done
+        try:
+            logged_in = self.login()
+        except Exception as exc:
+            self._login_failed(exc)
+            logged_in = False
+        if not logged_in:
+            self._append_login_message()
+        return logged_in
+
+    def _category_fetchers(self) -> List[Tuple[str, Callable[[], List[LOFInfo]]]]:
+        return [
+            ("index_lof", self.get_index_lof),
+            ("stock_lof", self.get_stock_lof),
+            ("qdii_lof", self.get_qdii_lof),
+            ("qdii_commodity", self.get_qdii_commodity),
+        ]
+
+    def _timed_fetch(self, name: str, fetcher: Callable[[], List[LOFInfo]]) -> List[LOFInfo]:
+        """抓取单个分类并记录耗时；单个分类失败不影响其他分类"""
+        started = time.perf_counter()
+        error = ""
+        try:
+            rows = fetcher()
+        except Exception as exc:
+            rows = []
+            error = str(exc)
+            print(f"[FETCH] {name} 抓取失败: {exc}")
+        self._record_fetch(name, rows, started, error)
+        return rows
+
+    def _fetch_categories(self, names: Tuple[str, ...]) -> Dict[str, List[LOFInfo]]:
+        fetchers = [(name, fetcher) for name, fetcher in self._category_fetchers() if name in names]
+        for name, _ in fetchers:
+            self._request_errors.pop(self.ENDPOINTS[name], None)
+
+        if self.parallel_fetch and self.max_workers > 1 and len(fetchers) > 1:
+            workers = min(self.max_workers, len(fetchers))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jisilu") as pool:
+                futures = [pool.submit(self._timed_fetch, name, fetcher) for name, fetcher in fetchers]
+                results = [future.result() for future in futures]
+        else:
+            results = [self._timed_fetch(name, fetcher) for name, fetcher in fetchers]
+        return {name: rows for (name, _), rows in zip(fetchers, results)}
+
+
+class CookieRenewer:
+    """
+    后台续期动态登录 Cookie。
+
+    watch 登记账号后，守护线程在缓存 Cookie 过期前 renew_lead 秒重新登录；
+    抓取时发现 Cookie 失效则调用 renew 立即唤醒线程。所有登录都在这一个线程里串行执行，
+    同一账号同一时刻最多一个登录请求；跨进程仍由 CookieStore 的登录锁保证只有一个 worker 登录，
+    其他 worker 拿到锁后发现缓存已续期就直接跳过。
+    登录失败按指数退避重试，遇到验证码时退避起点更长，避免反复触发风控。失败次数和退避截止时间
+    在登录锁内写入 CookieStore，各 worker 共用，退避结束后也只有一个 worker 重试。
+    """
+
+    def __init__(
+        self,
+        cookie_store: Optional[CookieStore] = None,
+        renew_lead: Optional[float] = None,
+        retry_interval: Optional[float] = None,
+        captcha_backoff: Optional[float] = None,
+        max_backoff: Optional[float] = None,
+        timeout: int = 10,
+    ):
+        self.cookie_store = cookie_store or COOKIE_STORE
+        ttl = max(env_int("JISILU_COOKIE_CACHE_TTL", 3600), 60)
+        lead = env_int("JISILU_COOKIE_RENEW_LEAD", 300) if renew_lead is None else renew_lead
+        self.renew_lead = min(max(0.0, float(lead)), ttl / 2)
+        self.retry_interval = float(retry_interval or 30)
+        self.captcha_backoff = float(captcha_backoff or env_int("JISILU_CAPTCHA_BACKOFF", 600))
+        self.max_backoff = float(max_backoff or 3600)
+        self.timeout = timeout
+        self._accounts: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def watch(self, username: str, password: str) -> None:
+        """登记账号并确保续期线程在运行；首次登记且没有可用缓存时立即登录"""
+        with self._lock:
+            account = self._accounts.get(username)
+            if account is None:
+                self._accounts[username] = {"password": password, "renewed_at": None}
+                self._wakeup.set()
+            else:
+                account["password"] = password
+            # 懒启动：gunicorn 预加载时 fork 前启动的线程不会被子进程继承
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="jisilu-cookie-renew", daemon=True)
+                self._thread.start()
+
+    def renew(self, username: str, stale_cookie: str) -> None:
+        """丢弃确认失效的 Cookie 并唤醒线程；退避期内不会提前重试"""
+        self.cookie_store.discard(username, stale_cookie)
+        self._wakeup.set()
+
+    def describe(self, username: str) -> Dict[str, Any]:
+        with self._lock:
+            account = dict(self._accounts.get(username) or {})
+        expires_at = self.cookie_store.expires_at(username)
+        state = self.cookie_store.login_state(username)
+        retry_at = state["retry_at"]
+        return {
+            "cookie_expires_at": round(expires_at) or None,
+            "retry_at": round(retry_at) if retry_at > time.time() else None,
+            "failures": state["failures"],
+            "last_error": state["last_error"],
+            "renewed_at": account.get("renewed_at"),
+        }
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def _due_at(self, username: str) -> float:
+        expires_at = self.cookie_store.expires_at(username)
+        return max(self.cookie_store.login_state(username)["retry_at"], expires_at - self.renew_lead)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            now = time.time()
+            wake_at = now + 60
+            with self._lock:
+                accounts = list(self._accounts.items())
+            for username, account in accounts:
+                due_at = self._due_at(username)
+                if due_at <= now:
+                    self._renew_now(username, account)
+                    due_at = self._due_at(username)
+                wake_at = min(wake_at, due_at)
+            # 即使没有到期也至少每分钟醒一次，感知其他进程写入的缓存
+            self._wakeup.wait(max(1.0, wake_at - time.time()))
+            self._wakeup.clear()
+
+    def _renew_now(self, username: str, account: Dict[str, Any]) -> None:
+        api = JisiluAPI(
+            username=username,
+            password=account["password"],
+            timeout=self.timeout,
+            cookie_store=self.cookie_store,
+        )
+        captcha = False
+        with self.cookie_store.login_lock(api._login_lock_timeout()):
+            # 等锁期间其他 worker 可能已经续期，或登录失败后进入了退避
+            if self.cookie_store.get(username, min_ttl=self.renew_lead):
+                return
+            state = self.cookie_store.login_state(username)
+            if state["retry_at"] > time.time():
+                return
             try:
-                price = self._parse_float(cell.get("price"))
-                estimate_value = self._parse_float(cell.get("estimate_value"))
-                fund_nav = self._parse_float(cell.get("fund_nav"))
-                net_value = fund_nav or estimate_value
-                # QDII 接口溢价率字段可能是 discount_rt 或 t1_premium_rate，取第一个有值的
-                api_premium_raw = (
-                    cell.get("discount_rt")
-                    if self._has_value(cell.get("discount_rt"))
-                    else cell.get("t1_premium_rate")
-                )
-                premium_rate, premium_source = self._compute_premium(
-                    cell, price, api_premium_raw, prefer_estimate=False
-                )
-                lof = LOFInfo(
-                    fund_id=cell.get("fund_id", ""),
-                    fund_name=cell.get("fund_nm", ""),
-                    price=price,
-                    change_pct=self._parse_percentage(cell.get("increase_rt")),
-                    net_value=net_value,
-                    premium_rate=premium_rate,
-                    volume=self._parse_float(cell.get("volume")),
-                    apply_status=cell.get("apply_status", ""),
-                    fund_type=fund_type,
-                    estimate_value=estimate_value,
-                    nav_date=cell.get("fund_nav_dt", "") or cell.get("nav_dt", ""),
-                    premium_source=premium_source,
+                ok = api._login_request()
+                captcha = api.login_captcha
+                message = api.login_message
+            except Exception as exc:
+                ok, message = False, f"动态登录异常：{exc}"
+            if not ok:
+                # 仍在登录锁内写入，下一个拿到锁的 worker 会看到新的退避时刻
+                failures = state["failures"] + 1
+                base = self.captcha_backoff if captcha else self.retry_interval
+                delay = min(base * 2 ** (failures - 1), self.max_backoff)
+                self.cookie_store.record_login_failure(username, failures, time.time() + delay, message)
+
+        if ok:
+            with self._lock:
+                account["renewed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            print(f"[COOKIE] 后台续期成功：{username}")
+            return
+        print(f"[COOKIE] 后台续期失败，{int(delay)} 秒后重试：{message}")
+
+
+class AsyncJisiluAPI(_JisiluBase):
+    """
+    基于 httpx 的异步集思录客户端。
+
+    login / get_*_lof / get_all_lof 的行为和鉴权判断与 JisiluAPI 一致，解析逻辑共用；
+    需要额外安装 httpx（pip install httpx）。
+    """
+
+    def __init__(
+        self,
+        cookie: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        timeout: int = 10,
+        max_connections: Optional[int] = None,
+        cookie_store: Optional[CookieStore] = None,
+        cookie_renewer: Optional["CookieRenewer"] = None,
+    ):
+        try:
+            import httpx
+        except ImportError as exc:
+            raise RuntimeError("缺少 httpx 依赖，无法使用异步集思录客户端") from exc
+
+        self.client = httpx.AsyncClient(
+            headers=self.DEFAULT_HEADERS,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections or env_int("HTTP_POOL_MAXSIZE", 16),
+                max_keepalive_connections=max_connections or env_int("HTTP_POOL_MAXSIZE", 16),
+            ),
+        )
+        # 只有传输层错误（连接失败、超时等）计入熔断失败
+        self._transport_error = httpx.TransportError
+        self._page_slots: Optional[asyncio.Semaphore] = None
+        # 回放模式下实际请求发往替身服务器（同步客户端由 HTTPPool 的 Session 统一改写）；
+        # BASE_URL 保持集思录地址，熔断状态仍按集思录主机与同步客户端共用
+        self._wire_base = HTTP_POOL.fixtures.rewrite(self.BASE_URL)
+        super().__init__(
+            cookie=cookie,
+            username=username,
+            password=password,
+            timeout=timeout,
+            cookie_store=cookie_store,
+            cookie_renewer=cookie_renewer,
+        )
+
+    async def __aenter__(self) -> "AsyncJisiluAPI":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def _set_cookie_header(self, cookie: str) -> None:
+        self.cookie = cookie or ""
+        if self.cookie:
+            self.client.headers["Cookie"] = self.cookie
+        else:
+            self.client.headers.pop("Cookie", None)
+
+    def _cookie_jar(self):
+        return self.client.cookies.jar
+
+    async def login(self) -> bool:
+        # CookieStore 的读盘、文件锁都是阻塞调用，放到线程里执行，避免卡住事件循环
+        done = await asyncio.to_thread(self._login_precheck)
+        if done is not None:
+            return done
+
+        handle = await asyncio.to_thread(self.cookie_store.acquire_login, self._login_lock_timeout())
+        try:
+            done = await asyncio.to_thread(self._login_precheck)
+            if done is not None:
+                return done
+            return await self._login_request()
+        finally:
+            self.cookie_store.release_login(handle)
+
+    async def _login_request(self) -> bool:
+        previous_cookie = self.cookie
+        previous_auth_source = self.auth_source
+        self.client.headers.pop("Cookie", None)
+        self.client.cookies.clear()
+
+        login_page_url = f"{self.BASE_URL}{self.LOGIN_PAGE}"
+        self._count_request()
+        response = await self.client.get(f"{self._wire_base}{self.LOGIN_PAGE}", headers={"Referer": self.BASE_URL})
+        response.raise_for_status()
+        data = self._login_form(response.text)
+        if data is None:
+            return self._restore_login_state(
+                previous_cookie, previous_auth_source, "集思录登录页未找到 AES key"
+            )
+
+        self._count_request()
+        login_response = await self.client.post(
+            f"{self._wire_base}{self.LOGIN_ENDPOINT}",
+            data=data,
+            headers={"Referer": login_page_url},
+        )
+        login_response.raise_for_status()
+        # 登录成功时要写 Cookie 缓存文件
+        return await asyncio.to_thread(
+            self._finish_login, login_response.json(), previous_cookie, previous_auth_source
+        )
+
+    async def _ensure_dynamic_cookie(self) -> None:
+        if self.cookie_renewer is not None:
+            if self.can_dynamic_login() and not self._login_attempted:
+                await asyncio.to_thread(self._use_renewed_cookie)
+            return
+        if self.has_auth_cookie() or not self.can_dynamic_login() or self._login_attempted:
+            return
+        self._login_attempted = True
+        try:
+            await self.login()
+        except Exception as exc:
+            self._login_failed(exc)
+
+    async def _request_page(self, endpoint: str, referer: str, params: Optional[Dict], page: int) -> Dict:
+        # 与同步客户端共用 HTTP_POOL 中该主机的熔断状态（不做对冲）
+        health = HTTP_POOL.upstream(f"{self.BASE_URL}{endpoint}")
+        health.check()
+        self._count_request()
+        started = time.perf_counter()
+        try:
+            response = await self.client.get(
+                f"{self._wire_base}{endpoint}",
+                params=self._page_params(params, page),
+                headers={"Referer": referer},
+            )
+        except self._transport_error:
+            health.record_failure()
+            raise
+        except BaseException:
+            # 被取消（asyncio.wait_for 超时等）时也要放开试探名额，否则熔断永远不会关闭
+            health.release_probe()
+            raise
+        health.record(response.status_code, time.perf_counter() - started)
+        response.raise_for_status()
+        return response.json()
+
+    async def _make_request(self, endpoint: str, referer: str, params: Optional[Dict] = None) -> Dict:
+        try:
+            first = await self._request_page(endpoint, referer, params, 1)
+        except Exception as e:
+            print(f"请求失败: {e}")
+            self._request_errors[endpoint] = str(e)
+            return {"rows": []}
+
+        page_count = self._remaining_pages(endpoint, first)
+        if page_count <= 1:
+            return first
+
+        # get_all_lof 期间各分类共用同一个信号量，单独调用 get_*_lof 时按本次请求限制
+        semaphore = self._page_slots or asyncio.Semaphore(self.max_pages_in_flight)
+
+        async def fetch_page(page: int) -> List[Dict]:
+            async with semaphore:
+                try:
+                    return (await self._request_page(endpoint, referer, params, page)).get("rows") or []
+                except Exception as e:
+                    print(f"分页请求失败 {endpoint} page={page}: {e}")
+                    self._request_errors[endpoint] = f"page {page}: {e}"
+                    return []
+
+        rest = await asyncio.gather(*(fetch_page(page) for page in range(2, page_count + 1)))
+        merged = dict(first)
+        merged["rows"] = list(first.get("rows") or [])
+        for page_rows in rest:
+            merged["rows"].extend(page_rows)
+        return merged
+
+    async def _fetch_category(self, name: str) -> Tuple[List[LOFInfo], int]:
+        for spec_name, referer_path, params, parser, fund_type in self.CATEGORY_SPECS:
+            if spec_name == name:
+                data = await self._make_request(
+                    self.ENDPOINTS[name], f"{self.BASE_URL}{referer_path}", params
                 )
-                result.append(lof)
-            except Exception as e:
-                print(f"解析 QDII 失败: {e}")
+                return self._parse_category(parser, fund_type, data), len(data.get("rows", []))
+        raise KeyError(name)
+
+    async def get_index_lof(self) -> List[LOFInfo]:
+        await self._ensure_dynamic_cookie()
+        result, row_count = await self._fetch_category("index_lof")
+        self._check_auth_status(row_count)
         return result
 
-    def get_all_lof(self) -> List[LOFInfo]:
-        if not self.has_auth_cookie():
-            self._ensure_dynamic_cookie()
+    async def get_stock_lof(self) -> List[LOFInfo]:
+        return (await self._fetch_category("stock_lof"))[0]
+
+    async def get_qdii_lof(self) -> List[LOFInfo]:
+        return (await self._fetch_category("qdii_lof"))[0]
 
-        all_data = self._fetch_all_lof_once()
-        if self.auth_status.get("status") == "ok" or not self.can_dynamic_login():
-            return all_data
+    async def get_qdii_commodity(self) -> List[LOFInfo]:
+        return (await self._fetch_category("qdii_commodity"))[0]
 
+    async def get_all_lof(self) -> List[LOFInfo]:
+        self._begin_refresh()
+        await self._ensure_dynamic_cookie()
+        started = time.perf_counter()
+        probed = self._should_probe()
+        # 信号量按调用创建：asyncio 原语绑定事件循环，同一个客户端可能先后在不同循环里使用
+        self._page_slots = asyncio.Semaphore(self.max_pages_in_flight)
         try:
-            logged_in = self.login()
+            if probed:
+                results = await self._fetch_categories(("index_lof",))
+                if self._needs_login() and await self._relogin():
+                    results.update(await self._fetch_categories(("index_lof",)))
+                results.update(await self._fetch_categories(self.CATEGORY_NAMES[1:]))
+            else:
+                results = await self._fetch_categories(self.CATEGORY_NAMES)
+            if self._needs_login() and await self._relogin():
+                results.update(await self._fetch_categories(tuple(self._guest_truncated(results))))
+        finally:
+            self._page_slots = None
+        return self._finish_refresh(results, "async", started, probed)
+
+    async def _relogin(self) -> bool:
+        done = await asyncio.to_thread(self._relogin_precheck)
+        if done is not None:
+            return done
+        try:
+            logged_in = await self.login()
         except Exception as exc:
-            if self.cookie:
-                self._set_cookie_header(self.cookie)
-            self.login_message = f"动态登录异常：{exc}"
+            self._login_failed(exc)
             logged_in = False
-
         if not logged_in:
-            self.auth_status["login_message"] = self.login_message
-            if self.login_message and self.login_message not in self.auth_status["message"]:
-                self.auth_status["message"] = f"{self.auth_status['message']}；{self.login_message}"
-            return all_data
+            self._append_login_message()
+        return logged_in
 
-        all_data = self._fetch_all_lof_once()
-        self.auth_status["login_message"] = self.login_message
-        return all_data
+    def _category_fetchers(self) -> List[Tuple[str, Callable[[], Any]]]:
+        return [
+            ("index_lof", self.get_index_lof),
+            ("stock_lof", self.get_stock_lof),
+            ("qdii_lof", self.get_qdii_lof),
+            ("qdii_commodity", self.get_qdii_commodity),
+        ]
+
+    async def _timed_fetch(self, name: str, fetcher: Callable[[], Any]) -> List[LOFInfo]:
+        started = time.perf_counter()
+        error = ""
+        try:
+            rows = await fetcher()
+        except Exception as exc:
+            rows = []
+            error = str(exc)
+            print(f"[FETCH] {name} 抓取失败: {exc}")
+        self._record_fetch(name, rows, started, error)
+        return rows
+
+    async def _fetch_categories(self, names: Tuple[str, ...]) -> Dict[str, List[LOFInfo]]:
+        fetchers = [(name, fetcher) for name, fetcher in self._category_fetchers() if name in names]
+        for name, _ in fetchers:
+            self._request_errors.pop(self.ENDPOINTS[name], None)
+        results = await asyncio.gather(*(self._timed_fetch(name, fetcher) for name, fetcher in fetchers))
+        return {name: rows for (name, _), rows in zip(fetchers, results)}
+
+
+# LOFTable 列布局：数值列用 array('d') 紧凑存储，低基数字符串列做 intern 共享
+LOF_FIELDS: Tuple[str, ...] = tuple(f.name for f in fields(LOFInfo))
+NUMERIC_FIELDS = frozenset(("price", "change_pct", "net_value", "premium_rate", "volume", "estimate_value"))
+INTERNED_FIELDS = frozenset(("apply_status", "fund_type", "premium_source", "nav_date"))
+# 行 JSON 模板，按 LOFInfo 字段顺序拼接预编码的值
+_ROW_JSON_TEMPLATE = "{" + ",".join(f'"{name}":%s' for name in LOF_FIELDS) + "}"
+
+
+def _encode_float(value: float) -> str:
+    # 与 json.dumps 一致：有限浮点数用 repr，NaN/Infinity 原样输出
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "Infinity" if value > 0 else "-Infinity"
+    return float.__repr__(value)
+
+
+def _row_picker(indices: List[int]) -> Callable[[Any], Any]:
+    """返回按 indices 批量取值的函数，结果为元组"""
+    if not indices:
+        return lambda column: ()
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda column: (column[index],)
+    return operator.itemgetter(*indices)
+
+
+class LOFRow:
+    """LOFTable 中一行的只读视图，属性与 LOFInfo 相同，不复制数据"""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "LOFTable", index: int):
+        self._table = table
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            column = self._table.columns[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        return column[self._index]
+
+    def to_info(self) -> LOFInfo:
+        return LOFInfo(*(self._table.columns[name][self._index] for name in LOF_FIELDS))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: self._table.columns[name][self._index] for name in LOF_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"LOFRow({self._table.columns['fund_id'][self._index]!r})"
+
+
+class LOFTable:
+    """
+    列式 LOF 数据表，快照内部的存储形式。
+
+    数值列为 array('d')，状态/类型等字符串 intern 后共享；
+    筛选、排序按列整体处理，序列化时直接拼接每行预编码的 JSON 片段，不构造逐行 dict。
+    迭代或下标访问得到 LOFRow 视图，兼容按属性读取 LOFInfo 的旧代码。
+    take() 得到的子表只记录行号，列和行 JSON 在首次用到时才从父表取出。
+    """
+
+    __slots__ = ("_columns", "_source", "_size", "_row_json", "_positions", "_index")
+
+    def __init__(
+        self,
+        columns: Optional[Dict[str, Any]] = None,
+        row_json: Optional[List[str]] = None,
+        source: Optional[Tuple["LOFTable", List[int]]] = None,
+    ):
+        self._columns = columns
+        self._source = source
+        self._size = len(source[1]) if source is not None else len(columns["fund_id"])
+        self._row_json = row_json
+        self._positions: Optional[Dict[str, int]] = None
+        self._index: Optional[LOFTableIndex] = None
+
+    @property
+    def columns(self) -> Dict[str, Any]:
+        if self._columns is None:
+            parent, indices = self._source
+            pick = _row_picker(indices)
+            self._columns = {
+                name: array("d", pick(column)) if name in NUMERIC_FIELDS else list(pick(column))
+                for name, column in parent.columns.items()
+            }
+        return self._columns
+
+    @classmethod
+    def from_rows(cls, rows: List[LOFInfo]) -> "LOFTable":
+        columns: Dict[str, Any] = {}
+        for name in LOF_FIELDS:
+            values = [getattr(lof, name) for lof in rows]
+            if name in NUMERIC_FIELDS:
+                columns[name] = array("d", map(float, values))
+            elif name in INTERNED_FIELDS:
+                columns[name] = [sys.intern(str(value)) for value in values]
+            else:
+                columns[name] = values
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield LOFRow(self, index)
+
+    def __getitem__(self, index: int) -> LOFRow:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return LOFRow(self, index)
+
+    def __getattr__(self, name: str) -> Any:
+        # table.premium_rate 等直接返回整列
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def to_infos(self) -> List[LOFInfo]:
+        return [LOFInfo(*values) for values in zip(*(self.columns[name] for name in LOF_FIELDS))]
+
+    def positions(self) -> Dict[str, int]:
+        """fund_id -> 行号"""
+        if self._positions is None:
+            self._positions = dict(zip(self.columns["fund_id"], range(self._size)))
+        return self._positions
+
+    def index(self) -> "LOFTableIndex":
+        """查询用的预计算索引，首次使用时构建，之后同一快照的请求共用"""
+        if self._index is None:
+            self._index = LOFTableIndex(self)
+        return self._index
+
+    def query(
+        self,
+        min_premium: Optional[float] = None,
+        min_volume: float = 0.0,
+        only_limited: bool = False,
+        fund_type: Optional[str] = None,
+        q: str = "",
+        limit: int = 0,
+    ) -> "LOFTable":
+        """
+        服务端筛选：在 filter 的规则上增加基金类型、代码/名称搜索和条数限制。
+
+        按溢价率降序遍历预排好的行号，min_premium 用二分直接截断，
+        类型/申购状态走分桶集合，凑够 limit 条即停止。
+        """
+        index = self.index()
+        order = index.order
+        if min_premium is not None:
+            order = order[:index.count_at_least(float(min_premium))]
+
+        allowed = None
+        if fund_type:
+            allowed = index.rows_of_types(fund_type)
+        if only_limited:
+            limited = index.limited_rows()
+            allowed = limited if allowed is None else allowed & limited
+
+        query = q.strip().lower()
+        if query:
+            exact = self.positions().get(query)
+            matched = {exact} if exact is not None else index.search(query)
+            allowed = matched if allowed is None else allowed & matched
+
+        volume = self.columns["volume"] if min_volume > 0 else None
+        exempt = index.volume_exempt_rows() if volume is not None else None
+        picked = []
+        for row in order:
+            if allowed is not None and row not in allowed:
+                continue
+            if volume is not None and volume[row] < min_volume and row not in exempt:
+                continue
+            picked.append(row)
+            if limit and len(picked) >= limit:
+                break
+        return self.take(picked)
+
+    def take(self, indices: List[int]) -> "LOFTable":
+        """按行号取子表，只记录行号；对子表再 take 时直接映射回最初的父表"""
+        if self._columns is None:
+            parent, base = self._source
+            return LOFTable(source=(parent, [base[index] for index in indices]))
+        return LOFTable(source=(self, list(indices)))
+
+    def row_json(self) -> List[str]:
+        """每行的 JSON 文本，首次调用时按列编码并缓存；子表直接复用父表的编码结果"""
+        row_json = self._row_json
+        if row_json is None and self._columns is None:
+            parent, indices = self._source
+            row_json = self._row_json = list(_row_picker(indices)(parent.row_json()))
+        if row_json is None:
+            encoded = [self._encoded(name) for name in LOF_FIELDS]
+            row_json = self._row_json = [_ROW_JSON_TEMPLATE % values for values in zip(*encoded)]
+        return row_json
+
+    def _encoded(self, name: str) -> Any:
+        encoder = _encode_float if name in NUMERIC_FIELDS else encode_basestring
+        return map(encoder, self.columns[name])
+
+    def to_json(self, fields: Optional[Tuple[str, ...]] = None) -> str:
+        """按行输出 JSON 数组；fields 指定时只输出这些字段（按给定顺序）"""
+        if fields is None or fields == LOF_FIELDS:
+            return "[" + ",".join(self.row_json()) + "]"
+        template = "{" + ",".join(f'"{name}":%s' for name in fields) + "}"
+        rows = zip(*(self._encoded(name) for name in fields))
+        return "[" + ",".join(map(template.__mod__, rows)) + "]"
+
+    def to_columnar_json(self, fields: Optional[Tuple[str, ...]] = None) -> str:
+        """列式 JSON：{"字段": [每行的值, ...], ...}，字段名只出现一次"""
+        return "{" + ",".join(
+            f'"{name}":[' + ",".join(self._encoded(name)) + "]" for name in (fields or LOF_FIELDS)
+        ) + "}"
+
+    def to_records(self, fields: Optional[Tuple[str, ...]] = None, columnar: bool = False) -> Any:
+        """转成普通的 list/dict 结构，供 MessagePack 等非 JSON 编码使用"""
+        names = fields or LOF_FIELDS
+        if columnar:
+            return {name: list(self.columns[name]) for name in names}
+        return [dict(zip(names, values)) for values in zip(*(self.columns[name] for name in names))]
+
+    def release_json(self) -> None:
+        """释放缓存的行 JSON；快照退居历史版本后只用于比对，不再序列化"""
+        self._row_json = None
+
+    def digest(self) -> str:
+        digest = hashlib.sha1()
+        for name in LOF_FIELDS:
+            column = self.columns[name]
+            if name in NUMERIC_FIELDS:
+                digest.update(column.tobytes())
+            else:
+                digest.update("\x1f".join(map(str, column)).encode("utf-8"))
+            digest.update(b"\x1e")
+        return digest.hexdigest()[:16]
+
+
+class LOFTableIndex:
+    """
+    LOFTable 的查询索引：溢价率降序行号、按基金类型和申购状态的分桶、搜索用的小写文本。
+
+    快照不可变，索引随快照一起缓存，查询只做集合运算和一次有序遍历。
+    """
+
+    def __init__(self, table: LOFTable):
+        premium = table.columns["premium_rate"]
+        self.order: List[int] = sorted(range(len(table)), key=premium.__getitem__, reverse=True)
+        # 升序的负溢价率，用于二分出 premium >= x 的前缀长度
+        self._ranked = [-premium[row] for row in self.order]
+        self.by_type: Dict[str, set] = {}
+        for row, fund_type in enumerate(table.columns["fund_type"]):
+            self.by_type.setdefault(fund_type, set()).add(row)
+        self.by_status: Dict[str, set] = {}
+        for row, status in enumerate(table.columns["apply_status"]):
+            self.by_status.setdefault(status, set()).add(row)
+        self._search_keys = [
+            f"{fund_id} {name}".lower()
+            for fund_id, name in zip(table.columns["fund_id"], table.columns["fund_name"])
+        ]
+        self._limited: Optional[set] = None
+        self._volume_exempt: Optional[set] = None
+
+    def count_at_least(self, min_premium: float) -> int:
+        return bisect_right(self._ranked, -min_premium)
+
+    def rows_of_types(self, fund_type: str) -> set:
+        """fund_type 可用逗号分隔多个，按子串匹配（如“指数”匹配“指数LOF”）"""
+        wanted = [item.strip().lower() for item in fund_type.split(",") if item.strip()]
+        rows = set()
+        for name, bucket in self.by_type.items():
+            if any(item in name.lower() for item in wanted):
+                rows |= bucket
+        return rows
+
+    def limited_rows(self) -> set:
+        if self._limited is None:
+            self._limited = self._status_rows(lambda status: status not in ("开放申购", "开放", ""))
+        return self._limited
+
+    def volume_exempt_rows(self) -> set:
+        # 暂停或限购的基金不受成交额门槛限制，与 filter_lof 一致
+        if self._volume_exempt is None:
+            self._volume_exempt = self._status_rows(lambda status: "暂停" in status or "限" in status)
+        return self._volume_exempt
+
+    def _status_rows(self, predicate: Callable[[str], bool]) -> set:
+        rows = set()
+        for status, bucket in self.by_status.items():
+            if predicate(status):
+                rows |= bucket
+        return rows
+
+    def search(self, query: str) -> set:
+        return {row for row, key in enumerate(self._search_keys) if query in key}
+
+
+@dataclass(frozen=True)
+class EncodedBody:
+    """预先序列化并压缩好的响应体；同一快照的同一视图只编码、压缩一次"""
+    identity: bytes
+    gzip: bytes
+    br: Optional[bytes] = None
+    mimetype: str = "application/json"
+
+    @classmethod
+    def from_text(cls, text: str) -> "EncodedBody":
+        return cls.from_bytes(text.encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, mimetype: str = "application/json") -> "EncodedBody":
+        return cls(
+            identity=raw,
+            # mtime=0 让相同内容得到相同的压缩结果
+            gzip=gzip.compress(raw, compresslevel=9, mtime=0),
+            br=brotli.compress(raw, quality=9) if brotli is not None else None,
+            mimetype=mimetype,
+        )
+
+    def negotiate(self, quality: Callable[[str], float]) -> Tuple[bytes, Optional[str]]:
+        """按 Accept-Encoding 的 q 值选择 br/gzip（q 值相同时优先 br），都不接受时返回原文"""
+        br_quality = quality("br") if self.br is not None else 0.0
+        gzip_quality = quality("gzip")
+        if br_quality > 0 and br_quality >= gzip_quality:
+            return self.br, "br"
+        if gzip_quality > 0:
+            return self.gzip, "gzip"
+        return self.identity, None
+
+
+@dataclass
+class LOFSnapshot:
+    """一次完整抓取得到的 LOF 快照，多个路由共享同一份解析结果"""
+    data: LOFTable
+    auth_status: Dict[str, Any]
+    fetched_at: float
+    # 行内容的哈希，数据不变时版本号不变；用于 ETag 和增量比对
+    version: str = ""
+
+    def __post_init__(self):
+        if not isinstance(self.data, LOFTable):
+            self.data = LOFTable.from_rows(self.data)
+        if not self.version:
+            self.version = self.data.digest()
+
+    @classmethod
+    def fetch(cls, api: JisiluAPI) -> "LOFSnapshot":
+        data = api.get_all_lof()
+        auth_status = dict(api.get_auth_status())
+        auth_status["stale"] = False
+        return cls(data=data, auth_status=auth_status, fetched_at=time.time())
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+    @property
+    def update_time(self) -> str:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.fetched_at))
+
+    @property
+    def revision(self) -> str:
+        """数据或鉴权/过期状态任一变化都会改变 revision，用于推送判断"""
+        revision = self.__dict__.get("_revision")
+        if revision is None:
+            revision = self.__dict__["_revision"] = self.etag()
+        return revision
+
+    def etag(self, variant: str = "") -> str:
+        """按路由变体生成 ETag；鉴权/过期状态变化也会让客户端重新下载"""
+        seed = "|".join((
+            self.version,
+            variant,
+            str(self.auth_status.get("status")),
+            str(bool(self.auth_status.get("stale"))),
+        ))
+        return hashlib.sha1(seed.encode("utf-8")).hexdigest()[:20]
+
+    def cached(self, key: Any, build: Callable[[], Any]) -> Any:
+        """
+        按 key 缓存基于本快照计算的结果（如各路由的响应体），快照替换后随之释放。
+
+        查询参数组合不可控，超过 LOF_SNAPSHOT_CACHE_LIMIT 个 key 后只计算不缓存。
+        """
+        cache = self.__dict__.setdefault("_cache", {})
+        value = cache.get(key)
+        if value is None:
+            value = build()
+            if len(cache) < SNAPSHOT_CACHE_LIMIT:
+                cache[key] = value
+        return value
+
+    def mark_stale(self, reason: str) -> "LOFSnapshot":
+        """刷新失败时沿用旧数据，并在 auth_status 中标记为过期"""
+        # 连续失败时以最后一次成功抓取的提示为基础，只保留最新一条失败原因
+        fresh_message = self.__dict__.get("_fresh_message", self.auth_status.get("message") or "")
+        auth_status = dict(self.auth_status)
+        message = f"数据刷新失败，继续展示 {self.update_time} 的快照：{reason}"
+        auth_status.update({
+            "stale": True,
+            "stale_reason": reason,
+            "stale_checked_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "message": f"{fresh_message}；{message}".lstrip("；"),
+        })
+        snapshot = LOFSnapshot(
+            data=self.data,
+            auth_status=auth_status,
+            fetched_at=self.fetched_at,
+            version=self.version,
+        )
+        snapshot.__dict__["_fresh_message"] = fresh_message
+        return snapshot
+
+
+# 单个快照最多缓存的响应体个数
+SNAPSHOT_CACHE_LIMIT = env_int("LOF_SNAPSHOT_CACHE_LIMIT", 64)
+
+# 增量接口关心的字段：任一字段变化即整行下发
+DELTA_FIELDS = ("price", "premium_rate", "volume", "apply_status")
+
+
+def diff_snapshots(old: LOFSnapshot, new: LOFSnapshot) -> Tuple[LOFTable, List[str]]:
+    """按 fund_id 比对两份快照，返回 (新增或变化的行组成的子表, 已移除的 fund_id)"""
+    if old.version == new.version:
+        return new.data.take([]), []
+    old_positions = old.data.positions()
+    new_ids = new.data.columns["fund_id"]
+    matches = list(map(old_positions.get, new_ids))
+    pairs = [(old.data.columns[name], new.data.columns[name]) for name in DELTA_FIELDS]
+    changed = [
+        index for index, previous in enumerate(matches)
+        if previous is None or any(old_col[previous] != new_col[index] for old_col, new_col in pairs)
+    ]
+    new_positions = new.data.positions()
+    removed = [fund_id for fund_id in old.data.columns["fund_id"] if fund_id not in new_positions]
+    return new.data.take(changed), removed
 
-    def _fetch_all_lof_once(self) -> List[LOFInfo]:
-        all_data = []
-        all_data.extend(self.get_index_lof())
-        all_data.extend(self.get_stock_lof())  # 新增
-        all_data.extend(self.get_qdii_lof())
-        all_data.extend(self.get_qdii_commodity())
-        return all_data
+
+class LOFSnapshotCache:
+    """
+    进程内共享的 LOF 快照缓存。
+
+    快照在 TTL 内直接复用；过期后只有一个请求负责抓取，
+    同时到达的其他请求等待这一次抓取的结果，不再各自请求集思录。
+    开启后台刷新后，守护线程会在 TTL 到期前重建快照，请求始终立即拿到最近一份可用快照。
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], LOFSnapshot],
+        ttl: Optional[float] = None,
+        background_refresh: Optional[bool] = None,
+        refresh_lead: Optional[float] = None,
+    ):
+        self._loader = loader
+        self.ttl = float(env_int("LOF_SNAPSHOT_TTL", 60) if ttl is None else ttl)
+        self.background_refresh = (
+            env_flag("LOF_BACKGROUND_REFRESH") if background_refresh is None else background_refresh
+        )
+        lead = env_int("LOF_REFRESH_LEAD", 10) if refresh_lead is None else refresh_lead
+        self.refresh_lead = min(max(0.0, float(lead)), self.ttl / 2)
+        # 刷新失败后的重试间隔，避免上游故障时后台线程空转、请求逐个回源
+        self.retry_interval = max(5.0, min(self.ttl, 30.0))
+        # 沿用过期快照时，下一次允许按需回源的时刻（monotonic）
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._snapshot: Optional[LOFSnapshot] = None
+        # 最近几个不同版本的快照，供增量接口按版本号比对
+        self._history: deque = deque(maxlen=max(1, env_int("LOF_SNAPSHOT_HISTORY", 12)))
+        self._inflight: Optional[Future] = None
+        self._updated = threading.Condition(self._lock)
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def peek(self) -> Optional[LOFSnapshot]:
+        return self._snapshot
+
+    def wait_for_update(self, revision: str, timeout: float) -> Optional[LOFSnapshot]:
+        """阻塞到出现与 revision 不同的快照或超时；一次刷新会唤醒所有等待者"""
+        with self._updated:
+            self._updated.wait_for(
+                lambda: self._snapshot is not None and self._snapshot.revision != revision,
+                timeout,
+            )
+            return self._snapshot
+
+    def find_version(self, version: str) -> Optional[LOFSnapshot]:
+        with self._lock:
+            for snapshot in reversed(self._history):
+                if snapshot.version == version:
+                    return snapshot
+        return None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+            self._retry_at = 0.0
+
+    def get(self) -> LOFSnapshot:
+        if self.background_refresh:
+            # 懒启动：gunicorn 预加载时 fork 前启动的线程不会被子进程继承
+            self.start_background_refresh()
+            snapshot = self._snapshot
+            if snapshot is not None:
+                return snapshot
+        return self.refresh(only_if_expired=True)
+
+    def refresh(self, only_if_expired: bool = False) -> LOFSnapshot:
+        """回源重建快照；并发调用共享同一次抓取"""
+        with self._lock:
+            snapshot = self._snapshot
+            if only_if_expired and snapshot is not None and (
+                snapshot.age < self.ttl or time.monotonic() < self._retry_at
+            ):
+                return snapshot
+            flight = self._inflight
+            leader = flight is None
+            if leader:
+                flight = self._inflight = Future()
+
+        if not leader:
+            return flight.result()
+
+        try:
+            snapshot = self._load(snapshot)
+        except BaseException as exc:
+            with self._lock:
+                self._inflight = None
+            flight.set_exception(exc)
+            raise
+
+        with self._lock:
+            previous = self._snapshot
+            self._snapshot = snapshot
+            stale = snapshot.auth_status.get("stale")
+            self._retry_at = time.monotonic() + self.retry_interval if stale else 0.0
+            if previous is not None and previous.data is not snapshot.data:
+                previous.data.release_json()
+            if not self._history or self._history[-1].version != snapshot.version:
+                self._history.append(snapshot)
+            self._inflight = None
+            if previous is None or previous.revision != snapshot.revision:
+                self._updated.notify_all()
+        flight.set_result(snapshot)
+        return snapshot
+
+    def _load(self, previous: Optional[LOFSnapshot]) -> LOFSnapshot:
+        try:
+            snapshot = self._loader()
+            if not snapshot.data and previous is not None and previous.data:
+                raise RuntimeError("上游返回空列表")
+            return snapshot
+        except Exception as exc:
+            if previous is None or not previous.data:
+                raise
+            print(f"[SNAPSHOT] 刷新失败，沿用上一份快照: {exc}")
+            return previous.mark_stale(str(exc))
+
+    def start_background_refresh(self) -> None:
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="lof-snapshot-refresh", daemon=True
+            )
+            self._refresher.start()
+
+    def stop_background_refresh(self) -> None:
+        self._stop.set()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            snapshot = self._snapshot
+            if snapshot is None:
+                delay = 0.0
+            elif snapshot.auth_status.get("stale"):
+                delay = self.retry_interval
+            else:
+                delay = max(0.0, self.ttl - self.refresh_lead - snapshot.age)
+            if self._stop.wait(delay):
+                break
+            try:
+                self.refresh()
+            except Exception as exc:
+                print(f"[SNAPSHOT] 后台刷新失败: {exc}")
+                self._stop.wait(self.retry_interval)
+
+
+def _parse_refresh_times(value: str) -> List[Tuple[int, int]]:
+    times = []
+    for item in value.split(","):
+        try:
+            hour, minute = (int(part) for part in item.strip().split(":"))
+        except ValueError:
+            continue
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            times.append((hour, minute))
+    return sorted(times) or [(15, 30), (21, 0)]
+
+
+# 历史数据可能变化的时刻：收盘后日线落地、晚间基金净值公布（仅周一至周五）
+HISTORY_REFRESH_TIMES = _parse_refresh_times(os.environ.get("HISTORY_REFRESH_TIMES", "15:30,21:00"))
+
+
+def next_history_refresh(now: Optional[float] = None, refresh_times: Optional[List[Tuple[int, int]]] = None) -> float:
+    """返回 now 之后第一个交易日刷新时刻的时间戳；周末不刷新，节假日按交易日处理（多刷新一次而已）"""
+    current = datetime.fromtimestamp(time.time() if now is None else now)
+    for offset in range(8):
+        day = current + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        for hour, minute in refresh_times or HISTORY_REFRESH_TIMES:
+            boundary = day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if boundary > current:
+                return boundary.timestamp()
+    return current.timestamp() + 86400
+
+
+class HistoryCache:
+    """
+    基金历史数据的 LRU 缓存。
+
+    日线和净值在下一次收盘/净值公布前不会变化，因此条目不按固定 TTL 过期，
+    而是在写入后的下一个刷新时刻（next_history_refresh）失效；热门基金每个交易时段只回源一次。
+    """
+
+    def __init__(self, maxsize: Optional[int] = None, expires: Callable[[float], float] = next_history_refresh):
+        self.maxsize = max(1, env_int("HISTORY_CACHE_SIZE", 256) if maxsize is None else maxsize)
+        self._expires = expires
+        self._entries: "OrderedDict[Any, Tuple[Any, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key: Any) -> Optional[Tuple[Any, float]]:
+        """命中时返回 (值, 写入时间戳)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key: Any, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, now, self._expires(now))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Any, loader: Callable[[], Any]) -> Tuple[Any, float, bool]:
+        """返回 (值, 写入时间戳, 是否命中)；loader 抛异常时不缓存"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached[0], cached[1], True
+        value = loader()
+        self.put(key, value)
+        return value, time.time(), False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+
+class HistoryStore:
+    """
+    基金历史日线/净值的本地列式存储，按基金、按表（price/nav）各占一个目录。
+
+    每列一个只追加的二进制文件（日期为 int32 的 yyyymmdd，数值为 float64，缺失值存 NaN/0），
+    读取时 mmap 映射后按日期列二分定位区间，只解码需要的行。<表>.json 记录当前代数、
+    已提交行数和覆盖起始日：追加时先写列文件再原子替换 meta，写到一半中断的尾部不会被读到。
+    同步时只向上游请求最后一个已存日期之后的数据；当日数据可能尚未定稿，不写入列文件，
+    只随 meta 暂存。每次回源后 meta 记录已核对到的截止日和下一个刷新时刻（next_history_refresh），
+    在此之前截止日不晚于它的请求直接读本地，周末、节假日或当日未定稿时也不会每次都回源。
+    请求的起始日早于已覆盖范围时整表重建到新一代目录。每张表有跨进程文件锁，
+    多个 worker 同时请求同一只基金时只有一个回源；等锁超过 LOCK_TIMEOUT 秒则不经存储直接回源。root 为空字符串时不落盘，直接回源。
+    """
+
+    TABLES: Dict[str, Tuple[Tuple[str, str], ...]] = {
+        "price": (
+            ("raw_date", "i"), ("open", "d"), ("high", "d"), ("low", "d"), ("close", "d"),
+            ("pct_chg", "d"), ("vol", "d"), ("amount", "d"),
+        ),
+        "nav": (("raw_date", "i"), ("ann_date", "i"), ("unit_nav", "d"), ("accum_nav", "d"), ("adj_nav", "d")),
+    }
+    KEY_RE = re.compile(r"^[\w.-]+(/[\w.-]+)*$")
+    DATE_RE = re.compile(r"^\d{8}$")
+    # 进程内按表名分段加锁：锁数量固定，不随查询过的基金数增长；同段的不同表偶尔串行，不影响正确性
+    LOCK_STRIPES = 64
+    # 等锁上限（秒）：持锁的请求卡在上游时，其他请求等到上限后直接回源，不落盘
+    LOCK_TIMEOUT = 10.0
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.environ.get("HISTORY_STORE_DIR", "") if root is None else root
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self.local_hits = 0
+        self.incremental = 0
+        self.appends = 0
+        self.rebuilds = 0
+        self.rows_fetched = 0
+        self.errors = 0
+
+    def sync(
+        self,
+        key: str,
+        table: str,
+        start: str,
+        end: str,
+        fetch: Callable[[str, str], List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """
+        返回 [start, end] 区间的行（按 raw_date 升序）。
+        fetch(start, end) 向上游请求并返回规范化后的行；本方法决定实际请求的区间。
+        """
+        if (not self.root or table not in self.TABLES or ".." in key or not self.KEY_RE.match(key)
+                or not self.DATE_RE.match(start) or not self.DATE_RE.match(end)):
+            return fetch(start, end)
+
+        directory = os.path.join(self.root, key)
+        key_lock = self._key_lock(f"{key}/{table}")
+        if not key_lock.acquire(timeout=self.LOCK_TIMEOUT):
+            print(f"[HISTORY] 等待 {key}/{table} 的锁超时，直接回源")
+            return fetch(start, end)
+        try:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                fd = _flock(os.path.join(directory, f"{table}.lock"), self.LOCK_TIMEOUT)
+            except OSError as exc:
+                print(f"[HISTORY] 打开历史存储失败: {exc}")
+                self.errors += 1
+                return fetch(start, end)
+            if fd is None and fcntl is not None:
+                print(f"[HISTORY] 等待 {key}/{table} 的文件锁超时，直接回源")
+                return fetch(start, end)
+            try:
+                return self._sync(directory, table, start, end, fetch)
+            finally:
+                _unlock(fd)
+        finally:
+            key_lock.release()
+
+    def _sync(self, directory, table, start, end, fetch):
+        today = datetime.now().strftime("%Y%m%d")
+        meta = self._read_meta(directory, table)
+        if meta is None or start < meta["start"]:
+            # 整表重建时连同已存的更晚数据一起取回，避免把后面的行丢掉
+            fetch_end = max(end, meta["last"]) if meta else end
+            rows = fetch(start, fetch_end)
+            self.rows_fetched += len(rows)
+            watermark = self._watermark(fetch_end, rows, today)
+            self._save(lambda: self._rebuild(directory, table, meta, start, rows, today, watermark))
+            return [row for row in rows if row["raw_date"] <= end]
+
+        last = meta["last"]
+        fresh: List[Dict[str, Any]] = []
+        since = self._next_day(last) if last else meta["start"]
+        checked = end <= meta.get("checked_end", "") and time.time() < meta.get("checked_until", 0)
+        if since <= end and not checked:
+            self.incremental += 1
+            fresh = fetch(since, end)
+            self.rows_fetched += len(fresh)
+            settled = sorted(
+                (row for row in fresh if last < row["raw_date"] < today),
+                key=lambda row: row["raw_date"],
+            )
+            watermark = self._watermark(end, fresh, today)
+            if settled:
+                meta = self._save(lambda: self._append(directory, table, meta, settled, watermark)) or meta
+            else:
+                meta = self._save(lambda: self._commit(directory, table, dict(meta, **watermark))) or meta
+        else:
+            self.local_hits += 1
+            if since <= end:
+                fresh = meta.get("unsettled") or []
+
+        try:
+            rows = self._read(directory, table, meta, start, end)
+        except (OSError, ValueError) as exc:
+            print(f"[HISTORY] 读取历史存储失败: {exc}")
+            self.errors += 1
+            return fetch(start, end)
+        stored_through = meta["last"]
+        rows.extend(row for row in fresh if row["raw_date"] > stored_through and start <= row["raw_date"] <= end)
+        return rows
+
+    def _save(self, write: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """写盘失败只打印，不影响本次返回的数据"""
+        try:
+            return write()
+        except (OSError, ValueError) as exc:
+            print(f"[HISTORY] 写入历史存储失败: {exc}")
+            self.errors += 1
+            return None
+
+    @staticmethod
+    def _watermark(end: str, rows: List[Dict[str, Any]], today: str) -> Dict[str, Any]:
+        """本次回源核对到的截止日、有效期（下一个刷新时刻）和未定稿的当日行"""
+        return {
+            "checked_end": end,
+            "checked_until": next_history_refresh(),
+            "unsettled": [row for row in rows if row["raw_date"] >= today],
+        }
+
+    def _key_lock(self, name: str) -> threading.Lock:
+        return self._locks[hash(name) % self.LOCK_STRIPES]
+
+    @staticmethod
+    def _next_day(value: str) -> str:
+        return (datetime.strptime(value, "%Y%m%d") + timedelta(days=1)).strftime("%Y%m%d")
+
+    @staticmethod
+    def _meta_path(directory: str, table: str) -> str:
+        return os.path.join(directory, f"{table}.json")
+
+    def _read_meta(self, directory: str, table: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(directory, table), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            print(f"[HISTORY] 读取历史存储元数据失败: {exc}")
+            return None
+        columns = [list(column) for column in self.TABLES[table]]
+        if not isinstance(meta, dict) or meta.get("columns") != columns:
+            return None
+        return meta
+
+    def _write_meta(self, directory: str, table: str, meta: Dict[str, Any]) -> None:
+        _atomic_write(self._meta_path(directory, table), json.dumps(meta).encode("utf-8"), 0o644)
+
+    def _column_path(self, directory: str, table: str, generation: int, name: str) -> str:
+        return os.path.join(directory, f"{table}.{generation}", f"{name}.bin")
+
+    def _encode(self, table: str, rows: List[Dict[str, Any]]) -> Dict[str, array]:
+        nan = float("nan")
+        columns = {}
+        for name, typecode in self.TABLES[table]:
+            if typecode == "i":
+                columns[name] = array("i", (int(row.get(name) or 0) for row in rows))
+            else:
+                columns[name] = array("d", (nan if row.get(name) is None else float(row[name]) for row in rows))
+        return columns
+
+    def _commit(self, directory, table, meta):
+        self._write_meta(directory, table, meta)
+        return meta
+
+    def _rebuild(self, directory, table, meta, start, rows, today, watermark):
+        settled = sorted((row for row in rows if row["raw_date"] < today), key=lambda row: row["raw_date"])
+        generation = (meta["generation"] + 1) if meta else 1
+        os.makedirs(os.path.join(directory, f"{table}.{generation}"), exist_ok=True)
+        for name, values in self._encode(table, settled).items():
+            with open(self._column_path(directory, table, generation, name), "wb") as f:
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        new_meta = {
+            "generation": generation,
+            "rows": len(settled),
+            "start": start,
+            "last": settled[-1]["raw_date"] if settled else "",
+            "columns": [list(column) for column in self.TABLES[table]],
+            **watermark,
+        }
+        self._write_meta(directory, table, new_meta)
+        self.rebuilds += 1
+        if meta:
+            shutil.rmtree(os.path.join(directory, f"{table}.{meta['generation']}"), ignore_errors=True)
+        return new_meta
+
+    def _append(self, directory, table, meta, rows, watermark):
+        generation = meta["generation"]
+        for name, values in self._encode(table, rows).items():
+            path = self._column_path(directory, table, generation, name)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                # 丢掉上次中断写入留下的未提交尾部
+                f.truncate(meta["rows"] * values.itemsize)
+                f.seek(0, os.SEEK_END)
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        new_meta = dict(meta, rows=meta["rows"] + len(rows), last=rows[-1]["raw_date"], **watermark)
+        self._write_meta(directory, table, new_meta)
+        self.appends += 1
+        return new_meta
+
+    def _read(self, directory, table, meta, start, end):
+        count = meta["rows"]
+        if not count:
+            return []
+        generation = meta["generation"]
+        columns: Dict[str, List[Any]] = {}
+        lo = hi = 0
+        for name, typecode in self.TABLES[table]:
+            path = self._column_path(directory, table, generation, name)
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), count * array(typecode).itemsize, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm).cast(typecode)
+                try:
+                    if name == "raw_date":
+                        lo = bisect_left(view, int(start))
+                        hi = bisect_right(view, int(end))
+                    columns[name] = view[lo:hi].tolist()
+                finally:
+                    view.release()
+            if lo >= hi:
+                return []
+
+        rows = []
+        for index, raw in enumerate(columns["raw_date"]):
+            raw_date = str(raw)
+            row: Dict[str, Any] = {"date": f"{raw_date[:4]}-{raw_date[4:6]}-{raw_date[6:]}", "raw_date": raw_date}
+            for name, typecode in self.TABLES[table][1:]:
+                value = columns[name][index]
+                if typecode == "i":
+                    row[name] = str(value) if value else None
+                else:
+                    row[name] = None if value != value else value
+            rows.append(row)
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": bool(self.root),
+            "local_hits": self.local_hits,
+            "incremental": self.incremental,
+            "appends": self.appends,
+            "rebuilds": self.rebuilds,
+            "rows_fetched": self.rows_fetched,
+            "errors": self.errors,
+        }
 
 
 def filter_lof(
-    data: List[LOFInfo],
+    data: Union[List[LOFInfo], LOFTable],
     min_premium: Optional[float] = None,
     min_volume: float = 0.0,
-    only_limited: bool = False
-) -> List[LOFInfo]:
-    """筛选 LOF 基金"""
-    filtered = data
-    
-    # 允许传入负数作为筛选门槛
-    if min_premium is not None:
-        filtered = [lof for lof in filtered if lof.premium_rate >= min_premium]
-    
-    if min_volume > 0:
+    only_limited: bool = False,
+    max_items: Optional[int] = None,
+) -> Union[List[LOFInfo], LOFTable]:
+    """筛选 LOF 基金；传入 LOFTable 时按列筛选并返回子表"""
+    if isinstance(data, LOFTable):
+        return data.query(
+            min_premium=min_premium,
+            min_volume=min_volume,
+            only_limited=only_limited,
+            limit=max_items or 0,
+        )
+
+    # 允许传入负数作为筛选门槛；单次遍历，不再为每个条件各建一个中间列表
+    floor = float("-inf") if min_premium is None else float(min_premium)
+    check_volume = min_volume > 0
+    filtered = [
+        lof for lof in data
+        if lof.premium_rate >= floor
         # 暂停或限购的基金即使成交额不足也保留（可能是停牌或核心套利标的）
-        filtered = [lof for lof in filtered if lof.volume >= min_volume or "暂停" in lof.apply_status or "限" in lof.apply_status]
-    
-    if only_limited:
-        filtered = [lof for lof in filtered if lof.apply_status not in ("开放申购", "开放", "")]
-    
+        and (not check_volume or lof.volume >= min_volume or "暂停" in lof.apply_status or "限" in lof.apply_status)
+        and (not only_limited or lof.apply_status not in ("开放申购", "开放", ""))
+    ]
+
     # 按溢价率降序排序
-    filtered = sorted(filtered, key=lambda x: x.premium_rate, reverse=True)
-    
-    return filtered
+    filtered.sort(key=operator.attrgetter("premium_rate"), reverse=True)
+    return filtered[:max_items] if max_items else filtered